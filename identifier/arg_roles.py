@@ -0,0 +1,151 @@
+import re
+import itertools
+
+import angr
+import simuvex
+
+import logging
+l = logging.getLogger("identifier.arg_roles")
+
+# what a function does with the value of a stack argument
+DEREF = "deref"
+COMPARED = "compared"
+BYTE = "byte"
+
+_reg_re = re.compile(r"\b(e?[abcd]x|[abcd][lh]|e?[sd]il?|e?[sb]pl?)\b")
+_byte_regs = {"al", "ah", "bl", "bh", "cl", "ch", "dl", "dh", "sil", "dil", "bpl", "spl"}
+# adding to a pointer still points into the same buffer
+_arith = {"add", "sub", "inc", "dec", "adc", "sbb"}
+_moves = {"mov", "movzx", "movsx", "lea"}
+
+
+def _family(reg):
+    """
+    :return: the 32 bit register a register is part of
+    """
+    if reg.startswith("e"):
+        return reg
+    if reg in ("si", "di", "sp", "bp", "sil", "dil", "spl", "bpl"):
+        return "e" + reg[:2]
+    return "e" + reg[0] + "x"
+
+
+def _regs(op):
+    return set(_family(r) for r in _reg_re.findall(op))
+
+
+def _is_byte(op):
+    return op.startswith("byte ptr") or op in _byte_regs
+
+
+def _load_uses(blocks, addr):
+    """
+    Follows the value loaded from a stack argument by the instruction at addr through the rest of its block
+    :param blocks:  where to lift the block from, a BlockCache or the project's factory
+    :return: the set of roles the value showed
+    """
+    try:
+        insns = blocks.block(addr).capstone.insns
+    except (angr.AngrError, simuvex.SimError):
+        return set()
+    if len(insns) == 0:
+        return set()
+
+    uses = set()
+    first = insns[0]
+    mnemonic = str(first.mnemonic)
+    ops = [o.strip() for o in str(first.op_str).split(",")]
+    if mnemonic in ("cmp", "test"):
+        uses.add(COMPARED)
+        if any(_is_byte(o) for o in ops):
+            uses.add(BYTE)
+        return uses
+    if mnemonic not in _moves or len(ops) != 2 or "[" in ops[0]:
+        return uses
+    if _is_byte(ops[0]) or _is_byte(ops[1]):
+        uses.add(BYTE)
+    tainted = _regs(ops[0])
+
+    for insn in insns[1:]:
+        if not tainted:
+            break
+        mnemonic = str(insn.mnemonic)
+        ops = [o.strip() for o in str(insn.op_str).split(",")]
+        if any("[" in o and _regs(o) & tainted for o in ops):
+            uses.add(DEREF)
+        if mnemonic in ("cmp", "test"):
+            regs = [o for o in ops if "[" not in o and _regs(o) & tainted]
+            if regs:
+                uses.add(COMPARED)
+                if any(_is_byte(o) for o in ops):
+                    uses.add(BYTE)
+            continue
+        if mnemonic == "call":
+            tainted -= {"eax", "ecx", "edx"}
+            continue
+        if len(ops) == 0 or "[" in ops[0] or not _regs(ops[0]):
+            continue
+
+        dst = _regs(ops[0])
+        src = ops[1] if len(ops) > 1 else ""
+        if mnemonic in _moves:
+            # a load through the pointer gives a value, not the pointer
+            if (mnemonic == "lea" or "[" not in src) and _regs(src) & tainted:
+                tainted |= dst
+            else:
+                tainted -= dst
+        elif mnemonic in _arith:
+            if _regs(src) & tainted:
+                tainted |= dst
+        elif mnemonic == "xor" and ops[0] == src:
+            tainted -= dst
+        elif mnemonic not in ("push", "cmp", "test"):
+            tainted -= dst
+    return uses
+
+
+def infer_arg_roles(project, func_info, blocks=None):
+    """
+    :param func_info:   the FuncInfo of the function
+    :param blocks:      the BlockCache to lift blocks through, by default they are lifted by the project
+    :return: for each stack argument in order the set of roles seen, or None if the function can't be analyzed
+    """
+    if func_info is None or func_info.stack_args is None or project.arch.name != "X86":
+        return None
+    if blocks is None:
+        blocks = project.factory
+    roles = []
+    for off in func_info.stack_args:
+        arg_roles = set()
+        # memory reads of the argument, "load" accesses only put its address in a register
+        for addr, action in func_info.stack_arg_accesses.get(off, ()):
+            if action == "read":
+                arg_roles |= _load_uses(blocks, addr)
+        roles.append(arg_roles)
+    return roles
+
+
+def rank_arg_orders(expected, slot_roles):
+    """
+    Orders the argument orders of a Func with an arg_order, as used by its fixup_test.
+    The roles are only a guess, so every order is kept and they just decide which ones are tried first.
+    :param expected:    for each base argument of the Func the role it must show, or None
+    :param slot_roles:  the roles of the function's arguments from infer_arg_roles, or None if unknown
+    :return: every order, most likely first
+    """
+    orders = list(itertools.permutations(range(len(expected))))
+    if slot_roles is None or len(slot_roles) != len(expected):
+        return orders
+
+    # an argument that is dereferenced is most likely a buffer
+    deref_slots = set(j for j, roles in enumerate(slot_roles) if DEREF in roles)
+    buf = expected.index(DEREF) if DEREF in expected else None
+
+    def score(order):
+        in_deref_slot = buf is not None and order.index(buf) in deref_slots
+        return in_deref_slot, sum(1 for j, base in enumerate(order)
+                                  if expected[base] is not None and expected[base] in slot_roles[j])
+
+    # sorting is stable, so equally likely orders keep their order
+    orders.sort(key=score, reverse=True)
+    return orders
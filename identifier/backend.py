@@ -0,0 +1,331 @@
+import simuvex
+import claripy
+from angr.errors import AngrCallableMultistateError, AngrCallableError
+from .custom_callable import Callable
+from .errors import EarlyAbort
+
+import logging
+l = logging.getLogger("identifier.backend")
+
+# where the string arguments of a call are placed, each one gets at least a page
+ARG_REGION = 0x2000
+ARG_SLOT_SIZE = 0x1000
+# memory reads that are closer together than this are done with one load
+BULK_READ_GAP = 0x2000
+
+
+def arg_layout(input_args, custom_offs=None):
+    """
+    Places the arguments of a call in the argument region
+    :param input_args:  strings, claripy bitvectors or ints
+    :param custom_offs: offsets to add to the addresses passed for the string arguments
+    :return: the list of values to pass to the function and a list of (address, data) to store
+    """
+    curr_buf_loc = ARG_REGION
+    mapped_input = []
+    stores = []
+    if custom_offs is None:
+        custom_offs = [0] * len(input_args)
+
+    for i, off in zip(input_args, custom_offs):
+        if isinstance(i, str):
+            stores.append((curr_buf_loc, i + "\x00"))
+            mapped_input.append(curr_buf_loc+off)
+            curr_buf_loc += max(len(i), ARG_SLOT_SIZE)
+        elif isinstance(i, claripy.ast.BV):
+            stores.append((curr_buf_loc, i))
+            mapped_input.append(curr_buf_loc+off)
+            curr_buf_loc += max(i.length / 8, ARG_SLOT_SIZE)
+        else:
+            if not isinstance(i, (int, long)):
+                raise Exception("Expected int/long got %s", type(i))
+            mapped_input.append(i)
+    return mapped_input, stores
+
+
+def map_args(state, input_args, custom_offs=None):
+    """
+    Stores the string arguments in the argument region of the state
+    :return: the list of values to pass to the function
+    """
+    mapped_input, stores = arg_layout(input_args, custom_offs)
+    for addr, data in stores:
+        state.memory.store(addr, data)
+    return mapped_input
+
+
+def _bvv_bytes(value, bits):
+    if bits == 0:
+        return ""
+    return ("%0*x" % (bits / 4, value)).decode("hex")
+
+
+def concrete_int(state, ast):
+    """
+    :return: the value of a bitvector, taken straight from the AST when it is concrete, or None if it is symbolic
+    """
+    if isinstance(ast, (int, long)):
+        return ast
+    if ast.op == 'BVV':
+        return ast.args[0]
+    if ast.symbolic:
+        return None
+    return state.se.any_int(ast)
+
+
+def concrete_bytes(state, ast):
+    """
+    :return: the bytes of a bitvector, taken straight from the AST when it is concrete, or None if it is symbolic
+    """
+    if ast.op == 'BVV':
+        return _bvv_bytes(ast.args[0], ast.args[1])
+    if ast.op == 'Concat' and all(a.op == 'BVV' and a.args[1] % 8 == 0 for a in ast.args):
+        return "".join(_bvv_bytes(a.args[0], a.args[1]) for a in ast.args)
+    if ast.symbolic:
+        return None
+    return state.se.any_str(ast)
+
+
+def _read_one(state, addr, length):
+    try:
+        data = concrete_bytes(state, state.memory.load(addr, length))
+    except simuvex.SimError as e:
+        l.info("could not read output: %s", e.message)
+        return None
+    if data is None:
+        l.info("symbolic memory output")
+    return data
+
+
+def read_buffers(state, regions):
+    """
+    Reads memory regions of a state, regions close to each other are loaded together
+    :param regions: a list of (address, length)
+    :return: a list with the bytes of each region, None for the ones that are symbolic or can't be read
+    """
+    results = [None] * len(regions)
+    order = sorted(xrange(len(regions)), key=lambda i: regions[i][0])
+    groups = []
+    for i in order:
+        addr, length = regions[i]
+        if groups and addr <= groups[-1][1] + BULK_READ_GAP:
+            groups[-1][1] = max(groups[-1][1], addr + length)
+            groups[-1][2].append(i)
+        else:
+            groups.append([addr, addr + length, [i]])
+
+    for lo, hi, members in groups:
+        data = None
+        if len(members) > 1:
+            try:
+                data = concrete_bytes(state, state.memory.load(lo, hi - lo))
+            except simuvex.SimError:
+                data = None
+        if data is None:
+            # something in the span is symbolic or unmapped, read the regions on their own
+            for i in members:
+                results[i] = _read_one(state, *regions[i])
+            continue
+        for i in members:
+            addr, length = regions[i]
+            results[i] = data[addr-lo:addr-lo+length]
+    return results
+
+
+class ProbeResult(object):
+    """
+    What a call did: the return value, the contents of the string arguments afterwards and what it wrote to stdout.
+    outputs maps the index of each argument that was read back to its contents. Values that were symbolic are None.
+    """
+
+    def __init__(self, return_val, outputs, stdout):
+        self.return_val = return_val
+        self.outputs = outputs
+        self.stdout = stdout
+
+    def matches(self, test_data, bits):
+        """
+        Checks the result the same way Runner.test does
+        :return: whether the test passed, or None if the probe didn't record enough of the arguments to tell
+        """
+        for i, out in enumerate(test_data.expected_output_args):
+            if not isinstance(out, str):
+                continue
+            if len(out) == 0:
+                raise Exception("len 0 out")
+            # symbolic bytes past the end of the expected output don't fail a test, so we can't tell
+            if self.outputs.get(i, None) is None or len(self.outputs[i]) < len(out):
+                return None
+            if self.outputs[i][:len(out)] != out:
+                return False
+
+        if self.return_val is None:
+            return False
+
+        if test_data.expected_return_val is not None and test_data.expected_return_val < 0:
+            test_data.expected_return_val &= (2**bits - 1)
+        if test_data.expected_return_val is not None and self.return_val != test_data.expected_return_val:
+            return False
+
+        return self.stdout is not None and self.stdout == test_data.expected_stdout
+
+
+class OutputWatch(object):
+    """
+    The stdout a test expects, so a call can be stopped as soon as it transmits something that can't match it.
+    Stdout only grows, so a prefix that doesn't match never will. Output buffers aren't watched, functions may
+    rewrite their bytes before returning, like an itoa that writes the digits in reverse and then swaps them.
+    """
+
+    def __init__(self, test_data):
+        """
+        :param test_data:   the test the call is for
+        """
+        self.stdout = test_data.expected_stdout
+
+    def stdout_matches(self, stdout):
+        """
+        :return: False if no more output can make stdout match
+        """
+        return self.stdout is not None and self.stdout.startswith(stdout)
+
+
+class Backend(object):
+    """
+    Runs a function on concrete inputs for the Runner.
+    The runner tries its backends in order, a backend that can't tell the outcome of a call raises BackendFallback
+    and the next one runs it instead.
+    """
+
+    def __init__(self, runner):
+        """
+        :param runner: the runner the backend belongs to, it provides the project and the prepared states
+        """
+        self.runner = runner
+        self.project = runner.project
+        # number of calls run, and number handed to the next backend
+        self.runs = 0
+        self.fallbacks = 0
+        # number of calls stopped early by an OutputWatch, and the steps they had left
+        self.aborts = 0
+        self.steps_saved = 0
+
+    def run(self, function, test_data, reads, concrete_rand=False, custom_offs=None, early_abort=False):
+        """
+        :param function:        the cfg function to call
+        :param test_data:       the TestData to take the arguments, stdin and max_steps from
+        :param reads:           a dict of argument index to the number of bytes to read back from it after the call
+        :param concrete_rand:   make the random syscall return concrete data
+        :param custom_offs:     offsets to add to the addresses passed for the string arguments
+        :param early_abort:     the backend may fail the call as soon as it writes stdout the test can't expect,
+                                see OutputWatch
+        :return: a ProbeResult, or None if the call failed
+        :raises BackendFallback: if the backend can't tell what the call does
+        """
+        raise NotImplementedError()
+
+
+class AngrBackend(Backend):
+    """
+    Steps the call through angr from the runner's prepared state, it can run every call
+    """
+
+    def __init__(self, runner):
+        super(AngrBackend, self).__init__(runner)
+        # callables of the last function called keyed by the number of arguments, they keep their last result
+        # state alive so only one function's are kept
+        self._callables = dict()
+        self._callables_addr = None
+
+    def _callable(self, function, num_args, state, max_steps):
+        """
+        :return: a Callable for the function starting from the state, shared between calls with as many arguments
+        """
+        if function.addr != self._callables_addr:
+            self._callables = dict()
+            self._callables_addr = function.addr
+        call = self._callables.get(num_args, None)
+        if call is None:
+            call = Callable(self.project, function.startpoint.addr, concrete_only=True,
+                            cc=self.runner._get_cc(num_args), base_state=state, max_steps=max_steps)
+            self._callables[num_args] = call
+        else:
+            call.set_base_state(state)
+            call.set_max_steps(max_steps)
+        return call
+
+    def call_state(self, function, test_data, initial_state=None, concrete_rand=False, custom_offs=None):
+        """
+        :return: the state at the start of the function with the arguments set up
+        """
+        s = self.runner.setup_state(function, test_data, initial_state, concrete_rand=concrete_rand)
+        mapped_input = map_args(s, test_data.input_args, custom_offs)
+        call = Callable(self.project, function.startpoint.addr, concrete_only=True,
+                        cc=self.runner._get_cc(len(mapped_input)), base_state=s, max_steps=test_data.max_steps)
+        return call.get_base_state(*mapped_input)
+
+    def _step_check(self, watch):
+        """
+        :return: a step check for Callable that fails once stdout can't match the watch
+        """
+        def check(s):
+            stdout = self.read_stdout(s)
+            return stdout is None or watch.stdout_matches(stdout)
+        return check
+
+    def call(self, function, test_data, initial_state=None, concrete_rand=False, custom_offs=None, early_abort=False):
+        """
+        :return: (return value, result state, the values passed to the function), the result is None if the call failed
+        """
+        s = self.runner.setup_state(function, test_data, initial_state, concrete_rand=concrete_rand)
+        mapped_input = map_args(s, test_data.input_args, custom_offs)
+        call = self._callable(function, len(mapped_input), s, test_data.max_steps)
+        call.set_step_check(self._step_check(OutputWatch(test_data)) if early_abort else None)
+
+        self.runs += 1
+        try:
+            result = call(*mapped_input)
+            result_state = call.result_state
+        except EarlyAbort as e:
+            l.debug("%#x: %s", function.addr, e.message)
+            self.aborts += 1
+            self.steps_saved += test_data.max_steps - call.steps
+            return None, None, mapped_input
+        except AngrCallableMultistateError as e:
+            l.info("multistate error: %s", e.message)
+            return None, None, mapped_input
+        except AngrCallableError as e:
+            l.info("other callable error: %s", e.message)
+            return None, None, mapped_input
+        return result, result_state, mapped_input
+
+    def run(self, function, test_data, reads, concrete_rand=False, custom_offs=None, early_abort=False):
+        result, result_state, mapped_input = self.call(function, test_data, concrete_rand=concrete_rand,
+                                                       custom_offs=custom_offs, early_abort=early_abort)
+        if result_state is None:
+            return None
+
+        # everything is usually concrete, so the values are read from the ASTs without the solver
+        idxs = sorted(reads)
+        outputs = read_buffers(result_state, [(mapped_input[i], reads[i]) for i in idxs])
+        return ProbeResult(concrete_int(result_state, result), dict(zip(idxs, outputs)),
+                           self.read_stdout(result_state))
+
+    @staticmethod
+    def read_stdout(result_state):
+        """
+        :return: what was written to stdout, or None if it is symbolic
+        """
+        stdout_file = result_state.posix.files[1]
+        pos = concrete_int(result_state, stdout_file.pos)
+        if pos is None:
+            l.info("symbolic stdout pos")
+            return None
+
+        if pos == 0:
+            return ""
+
+        stdout = concrete_bytes(result_state, stdout_file.content.load(0, pos))
+        if stdout is None:
+            l.info("symbolic stdout")
+        return stdout
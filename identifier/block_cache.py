@@ -0,0 +1,98 @@
+from .cache import LRUCache
+from .stack_offsets import reg_name
+
+import logging
+l = logging.getLogger("identifier.block_cache")
+
+
+class InsnFacts(object):
+    """
+    What the stack analysis needs to know about a single instruction
+    """
+
+    def __init__(self, bl):
+        """
+        :param bl:  the block of just the instruction
+        """
+        # vex does really weird stuff with bit test instructions
+        self.is_bt = bl.bytes.startswith("\x0f\xa3")
+        self.is_jump_or_call = self._jump_or_call(bl)
+        self.uses_sp_or_bp = self._sp_or_bp(bl)
+
+    @staticmethod
+    def _jump_or_call(bl):
+        if bl.vex.jumpkind != "Ijk_Boring":
+            return True
+        if len(bl.vex.constant_jump_targets) != 1:
+            return True
+        if next(iter(bl.vex.constant_jump_targets)) != bl.addr + bl.size:
+            return True
+        return False
+
+    @staticmethod
+    def _sp_or_bp(bl):
+        for s in bl.vex.statements:
+            for e in [s] + s.expressions:
+                if e.tag == "Iex_Get" or e.tag == "Ist_Put":
+                    reg = reg_name(bl.arch, e.offset)
+                    if reg == "ebp" or reg == "esp":
+                        return True
+        return False
+
+
+class BlockCache(object):
+    """
+    Lifted blocks and the facts derived from them, shared by everything the Identifier analyzes
+    """
+
+    def __init__(self, project, max_entries):
+        self.project = project
+        self._blocks = LRUCache(max_entries)
+        self._facts = LRUCache(max_entries)
+        self._floats = LRUCache(max_entries)
+
+    def block(self, addr, num_inst=None):
+        """
+        :return: the block at addr, as project.factory.block gives it
+        """
+        key = (addr, num_inst)
+        bl = self._blocks.get(key)
+        if bl is None:
+            bl = self.project.factory.block(addr, num_inst=num_inst)
+            self._blocks.put(key, bl)
+        return bl
+
+    def insn_facts(self, addr):
+        """
+        :return: the InsnFacts of the instruction at addr
+        """
+        facts = self._facts.get(addr)
+        if facts is None:
+            facts = InsnFacts(self.block(addr, num_inst=1))
+            self._facts.put(addr, facts)
+        return facts
+
+    def has_float_consts(self, func):
+        """
+        :return: True if the first block of the function uses floating point constants
+        """
+        has_floats = self._floats.get(func.addr)
+        if has_floats is None:
+            # calling _get_block() from `func` respects the size of the basic block
+            # in extreme cases (like at the end of a section where VEX cannot disassemble the instruction beyond the
+            # section boundary), directly calling project.factory.block() on func.addr may lead to an
+            # AngrTranslationError.
+            bl = func._get_block(func.addr).vex
+            has_floats = any(c.type.startswith("Ity_F") for c in bl.all_constants)
+            self._floats.put(func.addr, has_floats)
+        return has_floats
+
+    def stats(self):
+        """
+        :return: a dict of cache name to (hits, misses)
+        """
+        return {
+            "block": (self._blocks.hits, self._blocks.misses),
+            "insn_facts": (self._facts.hits, self._facts.misses),
+            "float_consts": (self._floats.hits, self._floats.misses),
+        }
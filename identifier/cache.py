@@ -0,0 +1,184 @@
+import os
+import hashlib
+import tempfile
+import cPickle as pickle
+from collections import OrderedDict
+
+import logging
+l = logging.getLogger("identifier.cache")
+
+
+def hash_file(path):
+    """
+    :param path: path of the file to hash
+    :return: the sha256 hex digest of the file contents
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(0x10000), ""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DiskCache(object):
+    """
+    A directory of pickled values, one file per key.
+    Keys are built with make_key so they are safe to use as file names.
+    If max_entries is set, the least recently used entries are evicted in a batch once there are more than
+    max_entries + slack, so the directory is only listed every slack writes.
+    """
+
+    def __init__(self, path, max_entries=None, slack=None):
+        """
+        :param path:        the directory to store the entries in, created if it does not exist
+        :param max_entries: the number of entries to keep, unbounded if None
+        :param slack:       how far the cache may grow past max_entries before evicting, a tenth of it by default
+        """
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.max_entries = max_entries
+        if slack is None and max_entries is not None:
+            slack = max_entries // 10
+        self.slack = slack
+        # the number of entries, counted the first time it is needed and kept up to date by put
+        self._count = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(*parts):
+        h = hashlib.sha256()
+        for p in parts:
+            p = str(p)
+            h.update(str(len(p)) + ":" + p)
+        return h.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key):
+        """
+        :return: the cached value, or None if there is no (readable) entry for the key
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                value = pickle.load(f)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError,
+                ValueError) as e:
+            l.warning("dropping unreadable cache entry %s: %s", entry_path, e)
+            self._remove(entry_path)
+            self.misses += 1
+            return None
+
+        if self.max_entries is not None:
+            # the modification time is the last use, touch it for the lru order
+            try:
+                os.utime(entry_path, None)
+            except OSError:
+                pass
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Stores a value, the write is atomic so concurrent readers never see a partial entry
+        :return: True if the value was stored
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self._entry_path(key))
+        except (pickle.PicklingError, TypeError, IOError, OSError) as e:
+            l.warning("could not store cache entry %s: %s", key, e)
+            self._remove(tmp_path)
+            return False
+
+        if self.max_entries is not None:
+            if self._count is None:
+                self._count = len(self._list_entries())
+            else:
+                # overwriting a key counts it twice, that only makes the next listing come early
+                self._count += 1
+            if self._count > self.max_entries + self.slack:
+                self._evict()
+        return True
+
+    def _list_entries(self):
+        """
+        :return: a list of (modification time, name) of the entries
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if name.startswith(".tmp"):
+                continue
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.path, name)), name))
+            except OSError:
+                # removed by another process
+                continue
+        return entries
+
+    def _evict(self):
+        """
+        Removes the least recently used entries down to max_entries.
+        Other processes may write to the same directory, so the entries are counted again here.
+        """
+        entries = self._list_entries()
+        self._count = len(entries)
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, name in entries[:len(entries) - self.max_entries]:
+            self._remove(os.path.join(self.path, name))
+            self.evictions += 1
+        self._count = self.max_entries
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class LRUCache(object):
+    """
+    An in-memory mapping that keeps the max_entries most recently used values
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # reinsert it as the most recently used
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
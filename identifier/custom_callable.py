@@ -1,5 +1,6 @@
 import simuvex
 from angr.errors import AngrCallableError, AngrCallableMultistateError
+from .errors import EarlyAbort
 
 import logging
 l = logging.getLogger("identifier.custom_callable")
@@ -41,7 +42,10 @@ class Callable(object):
         self._cc = cc if cc is not None else simuvex.DefaultCC[project.arch.name](project.arch)
         self._deadend_addr = project._simos.return_deadend
         self._max_steps = max_steps
+        self._step_check = None
 
+        # number of steps the last call took
+        self.steps = 0
         self.result_path_group = None
         self.result_state = None
 
@@ -52,6 +56,20 @@ class Callable(object):
         """
         self._base_state = state
 
+    def set_max_steps(self, max_steps):
+        """
+        Change the number of steps a call may take
+        :param max_steps: The maximum number of steps
+        """
+        self._max_steps = max_steps
+
+    def set_step_check(self, step_check):
+        """
+        Set a function to call on the state after each step, the call is aborted if it returns False
+        :param step_check: A function taking the state, or None
+        """
+        self._step_check = step_check
+
     def __call__(self, *args):
         self.perform_call(*args)
         if self.result_state is not None:
@@ -83,6 +101,7 @@ class Callable(object):
             return pg2
 
         caller = self._project.factory.path_group(state, immutable=True)
+        self.steps = 0
         for _ in xrange(self._max_steps):
             if len(caller.active) == 0:
                 break
@@ -90,6 +109,10 @@ class Callable(object):
                 l.debug("super long path %s", caller.active[0])
                 raise AngrCallableError("Super long path")
             caller = caller.step(step_func=step_func if self._concrete_only else None)
+            self.steps += 1
+            if self._step_check is not None and len(caller.active) == 1 and \
+                    not self._step_check(caller.active[0].state):
+                raise EarlyAbort("aborted after %d steps" % self.steps)
         if len(caller.active) > 0:
             raise AngrCallableError("didn't make it to the end of the function")
 
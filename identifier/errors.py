@@ -4,3 +4,11 @@ class IdentifierException(Exception):
 
 class FunctionNotInitialized(Exception):
     pass
+
+
+class BackendFallback(IdentifierException):
+    pass
+
+
+class EarlyAbort(IdentifierException):
+    pass
@@ -17,6 +17,11 @@ class TestData(object):
 
 
 class Func(object):
+    # the FuncInfo of the cfg function while pre_test runs, or None if there is none
+    func_info = None
+    # the Identifier's BlockCache while pre_test runs
+    blocks = None
+
     def __init__(self):
         pass
 
@@ -26,6 +31,30 @@ class Func(object):
     def num_args(self):
         raise NotImplementedError()
 
+    def arg_counts(self):
+        """
+        :return: the set of argument counts the function can be found with,
+                 override it if some versions of the function don't use all of their arguments
+        """
+        return {self.num_args()}
+
+    def match_attrs(self):
+        """
+        :return: the public attributes the Func declares in __init__, such as the version its tests found.
+                 They are all a cached match keeps.
+        """
+        declared = type(self)().__dict__
+        return dict((k, getattr(self, k)) for k in declared if not k.startswith("_"))
+
+    def set_match_attrs(self, attrs):
+        """
+        Restores the attributes of a cached match, ones the Func doesn't declare anymore are dropped
+        """
+        declared = self.match_attrs()
+        for k, v in attrs.items():
+            if k in declared:
+                setattr(self, k, v)
+
     def gen_input_output_pair(self):
         raise NotImplementedError()
 
@@ -35,6 +64,14 @@ class Func(object):
     def can_call_other_funcs(self):
         return True
 
+    def necessary_tests(self):
+        """
+        Tests with fixed inputs that every version of the function passes.
+        They are run before pre_test to rule out candidates cheaply, candidates using the same inputs share the run.
+        :return: a list of TestData
+        """
+        return []
+
     def pre_test(self, func, runner):
         """
         custom tests run before, return False if it for sure is not the function
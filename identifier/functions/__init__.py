@@ -33,3 +33,21 @@ for proc_file_name in os.listdir(path):
         attr = getattr(proc_module, attr_name)
         if isinstance(attr, type) and issubclass(attr, Func) and attr_name != "Func":
             Functions[attr_name] = attr
+
+
+# Index the candidates by (number of args, var args, calls other functions), so finding the ones to test for a
+# function is a single lookup. Functions that call others can only be the candidates which can call other functions.
+_candidate_index = defaultdict(list)
+for name, func_class in Functions.iteritems():
+    f = func_class()
+    for num_args in f.arg_counts():
+        _candidate_index[(num_args, f.var_args(), False)].append(name)
+        if f.can_call_other_funcs():
+            _candidate_index[(num_args, f.var_args(), True)].append(name)
+
+
+def get_candidates(num_args, var_args, calls_other_funcs):
+    """
+    :return: the names of the Functions that can match a function with this signature, in Functions order
+    """
+    return _candidate_index.get((num_args, bool(var_args), bool(calls_other_funcs)), [])
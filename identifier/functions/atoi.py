@@ -40,6 +40,10 @@ class atoi(Func):
         max_steps = 20
         return TestData(test_input, test_output, return_val, max_steps)
 
+    def necessary_tests(self):
+        s = "1234567"
+        return [TestData([s], [s], 1234567, 20)]
+
     def pre_test(self, func, runner):
         num = random.randint(-(2 ** 26), 2 ** 26 - 1)
 
@@ -27,26 +27,6 @@ def int2base(x, base):
     return ''.join(digits)
 
 
-class OneTwoOrThree(object):
-    def __eq__(self, other):
-        if other == 1:
-            return True
-        if other == 2:
-            return True
-        if other == 3:
-            return True
-        return False
-
-    def __ne__(self, other):
-        if other == 1:
-            return False
-        if other == 2:
-            return False
-        if other == 3:
-            return False
-        return True
-
-
 class based_atoi(Func):
     def __init__(self):
         super(based_atoi, self).__init__()
@@ -59,7 +39,11 @@ class based_atoi(Func):
         return "".join(random.choice(byte_list) for _ in xrange(length))
 
     def num_args(self):
-        return OneTwoOrThree()
+        return 3
+
+    def arg_counts(self):
+        # size and err are not used by every version
+        return {1, 2, 3}
 
     def args(self):
         return ["buf", "size", "err"]
@@ -1,10 +1,17 @@
 from ..func import Func, TestData
-import random
 from ..errors import IdentifierException
 
 import logging
 l = logging.getLogger("identifier.functions.free")
 
+# the chunks malloc is asked for and how many times malloc and the candidate are called
+MALLOC_SIZE = 0x80
+NUM_ALLOCS = 10
+MAX_STEPS = 10
+# writes this close to the stack pointer are taken as the candidate's own frame
+STACK_WINDOW = 0x10000
+
+
 class free(Func):
     def __init__(self):
         super(free, self).__init__()
@@ -22,42 +29,85 @@ class free(Func):
         # free should not be identified here
         return False
 
-    def try_match(self, func, identifier, runner):
+    @staticmethod
+    def _find_malloc(identifier):
         malloc = None
         for k, v in identifier.matches.iteritems():
             if v[0] == "malloc":
                 malloc = k
+        return malloc
+
+    def can_match(self, identifier):
+        """
+        :return: False if no function can match, without looking at any of them
+        """
+        return self._find_malloc(identifier) is not None
+
+    @staticmethod
+    def _malloc(malloc, runner, state):
+        """
+        Calls malloc and fills the chunk it returns
+        :return: the state after the call and the pointer
+        """
+        malloc_test = TestData([MALLOC_SIZE], [None], None, MAX_STEPS)
+        state = runner.get_out_state(malloc, malloc_test, initial_state=state)
+        if state is None:
+            l.critical("malloc failed")
+            raise IdentifierException("malloc failed")
+        val = state.se.any_int(state.regs.eax)
+        if val >= 0x10000:
+            state.memory.store(val, state.se.BVS("some_data", MALLOC_SIZE*8))
+        return state, val
+
+    def _chain_step(self, malloc, runner, i):
+        """
+        The i-th call of malloc when nothing was freed before, the calls are shared by the candidates in the runner
+        :return: the state after the call and the pointer
+        """
+        chain = runner.malloc_chains.setdefault(malloc.addr, [])
+        # a failed call is kept as None, the calls after it are never made
+        while len(chain) <= i and (len(chain) == 0 or chain[-1] is not None):
+            try:
+                chain.append(self._malloc(malloc, runner, chain[-1][0] if chain else None))
+            except IdentifierException:
+                chain.append(None)
+        if len(chain) <= i or chain[i] is None:
+            raise IdentifierException("malloc failed")
+        return chain[i]
+
+    @staticmethod
+    def _changes_heap(before, after):
+        """
+        :return: True if the call wrote memory outside of its stack frame or allocated, so malloc may act differently
+        """
+        if after.cgc.allocation_base != before.cgc.allocation_base:
+            return True
+        sp = before.se.any_int(before.regs.sp)
+        return any(not sp - STACK_WINDOW <= a < sp + STACK_WINDOW for a in after.memory.changed_bytes(before.memory))
+
+    def try_match(self, func, identifier, runner):
+        malloc = self._find_malloc(identifier)
         if malloc is None:
             return False
 
-        num = 0x80
-        test_input = [num]
-        test_output = [None]
-        return_val = None
-        max_steps = 10
-        malloc_test = TestData(test_input, test_output, return_val, max_steps)
-
+        # alternate malloc and the candidate, a real free lets malloc hand out a chunk again
+        # while the candidate leaves the heap alone, malloc acts as if nothing was freed, so the shared calls are used
         malloc_vals = []
         state = None
-        for i in range(10):
-            state = runner.get_out_state(malloc, malloc_test, initial_state=state)
-            if state is None:
-                l.critical("malloc failed")
-                raise IdentifierException("malloc failed")
-            malloc_vals.append(state.se.any_int(state.regs.eax))
-            if malloc_vals[-1] < 0x10000:
+        unchanged = True
+        for i in range(NUM_ALLOCS):
+            if unchanged:
+                state, val = self._chain_step(malloc, runner, i)
+            else:
+                state, val = self._malloc(malloc, runner, state)
+            malloc_vals.append(val)
+            if val < 0x10000:
                 return False
-            test_input = [malloc_vals[-1]]
-            test_output = [None]
-            return_val = None
-            state.memory.store(malloc_vals[-1], state.se.BVS("some_data", 0x80*8))
-            free_test = TestData(test_input, test_output, return_val, max_steps)
-            state = runner.get_out_state(func, free_test, initial_state=state)
-            if state is None:
+            free_test = TestData([val], [None], None, MAX_STEPS)
+            free_state = runner.get_out_state(func, free_test, initial_state=state)
+            if free_state is None:
                 return False
+            unchanged = unchanged and not self._changes_heap(state, free_state)
+            state = free_state
 
-        if len(malloc_vals) == len(set(malloc_vals)):
-            return False
-
-        return True
-
+        return len(malloc_vals) != len(set(malloc_vals))
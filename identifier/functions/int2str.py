@@ -4,53 +4,18 @@ import string
 
 digs = string.digits + string.letters
 
+# the pretests use fixed numbers so versions calling the function with the same arguments share the probes,
+# they differ in length and sign so an implementation that only handles one of them doesn't pass
+PROBE_NUMS = (38125967, 7, 40516)
+SIGNED_PROBE_NUMS = (-38125967, -7)
 
-class TwoOrThree(object):
-    def __eq__(self, other):
-        if other == 2:
-            return True
-        if other == 3:
-            return True
-        return False
 
-    def __ne__(self, other):
-        if other == 2:
-            return False
-        if other == 3:
-            return False
-        return True
-
-
-class ThreeOrFour(object):
-    def __eq__(self, other):
-        if other == 3:
-            return True
-        if other == 4:
-            return True
-        return False
-
-    def __ne__(self, other):
-        if other == 3:
-            return False
-        if other == 4:
-            return False
-        return True
-
-
-class FourOrFive(object):
-    def __eq__(self, other):
-        if other == 4:
-            return True
-        if other == 5:
-            return True
-        return False
-
-    def __ne__(self, other):
-        if other == 4:
-            return False
-        if other == 5:
-            return False
-        return True
+def _passes_all(func, runner, make_test, nums):
+    """
+    :param make_test:   makes the TestData for a number
+    :return: True if the function passes the test of every number
+    """
+    return all(runner.probe_test(func, make_test(num)) for num in nums)
 
 
 class int2str(Func):
@@ -87,32 +52,19 @@ class int2str(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
-    def pre_test(self, func, runner):
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = abs(num)
-        s = str(num)
-        test_input = ["A"*15, 15, num]
-        test_output = [s, None, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        if not runner.test(func, test):
-            return False
+    @staticmethod
+    def _probe(num):
+        return TestData(["A"*15, 15, num], [str(num), None, None], None, 10)
 
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = -abs(num)
-        s = str(num)
-        test_input = ["A"*15, 15, num]
-        test_output = [s, None, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        if not runner.test(func, test):
-            self.is_signed = False
-        else:
-            self.is_signed = True
+    def necessary_tests(self):
+        # the unsigned pretests
+        return [self._probe(num) for num in PROBE_NUMS]
 
+    def pre_test(self, func, runner):
+        if not _passes_all(func, runner, self._probe, PROBE_NUMS):
+            return False
 
+        self.is_signed = _passes_all(func, runner, self._probe, SIGNED_PROBE_NUMS)
         return True
 
 
@@ -127,7 +79,11 @@ class int2str_v2(Func):
         return "".join(random.choice(byte_list) for _ in xrange(length))
 
     def num_args(self):
-        return TwoOrThree()
+        return 3
+
+    def arg_counts(self):
+        # max is not used by every version
+        return {2, 3}
 
     def args(self):
         return ["val", "buf", "max"]
@@ -150,31 +106,19 @@ class int2str_v2(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
+    @staticmethod
+    def _probe(num):
+        return TestData([num, "A"*15, 12], [None, str(num), None], None, 10)
+
+    def necessary_tests(self):
+        # the unsigned pretests
+        return [self._probe(num) for num in PROBE_NUMS]
+
     def pre_test(self, func, runner):
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = abs(num)
-        s = str(num)
-        test_input = [num, "A"*15, 12]
-        test_output = [None, s, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        if not runner.test(func, test):
+        if not _passes_all(func, runner, self._probe, PROBE_NUMS):
             return False
 
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = -abs(num)
-        s = str(num)
-        test_input = [num, "A"*15, 12]
-        test_output = [None, s, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        if not runner.test(func, test):
-            self.is_signed = False
-        else:
-            self.is_signed = True
-
+        self.is_signed = _passes_all(func, runner, self._probe, SIGNED_PROBE_NUMS)
         return True
 
 
@@ -189,7 +133,11 @@ class int2str_v3(Func):
         return "".join(random.choice(byte_list) for _ in xrange(length))
 
     def num_args(self):
-        return TwoOrThree()
+        return 3
+
+    def arg_counts(self):
+        # max is not used by every version
+        return {2, 3}
 
     def args(self):
         return ["buf", "val", "max"]
@@ -212,31 +160,23 @@ class int2str_v3(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
+    @staticmethod
+    def _probe(num):
+        return TestData(["A"*15, num, 12], [str(num), None, None], None, 10)
+
+    @staticmethod
+    def _signed_probe(num):
+        return TestData([num, "A"*15, 12], [str(num), None, None], None, 10)
+
+    def necessary_tests(self):
+        # the unsigned pretests
+        return [self._probe(num) for num in PROBE_NUMS]
+
     def pre_test(self, func, runner):
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = abs(num)
-        s = str(num)
-        test_input = ["A"*15, num, 12]
-        test_output = [s, None, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        if not runner.test(func, test):
+        if not _passes_all(func, runner, self._probe, PROBE_NUMS):
             return False
 
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = -abs(num)
-        s = str(num)
-        test_input = [num, "A"*15, 12]
-        test_output = [s, None, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        if not runner.test(func, test):
-            self.is_signed = False
-        else:
-            self.is_signed = True
-
+        self.is_signed = _passes_all(func, runner, self._signed_probe, SIGNED_PROBE_NUMS)
         return True
 
 
@@ -251,7 +191,11 @@ class int2str_v4(Func):
         return "".join(random.choice(byte_list) for _ in xrange(length))
 
     def num_args(self):
-        return ThreeOrFour()
+        return 3
+
+    def arg_counts(self):
+        # some versions take a fourth argument
+        return {3, 4}
 
     def args(self):
         return ["buf", "val", "base"]
@@ -274,32 +218,19 @@ class int2str_v4(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
+    @staticmethod
+    def _hex_probe(num, upper=False):
+        s = hex(num).replace("0x", "").replace("L", "")
+        return TestData(["A"*15, num, 16], [s.upper() if upper else s.lower(), None, None], None, 10)
+
+    @staticmethod
+    def _signed_probe(num):
+        return TestData([num, "A"*15, 10], [str(num), None, None], None, 10)
+
     def pre_test(self, func, runner):
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = abs(num)
-        s = hex(num).replace("0x", "").replace("L", "").lower()
-        s2 = hex(num).replace("0x", "").replace("L", "").upper()
-        test_input = ["A"*15, num, 16]
-        test_output = [s, None, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        test_output2 = [s2, None, None]
-        test2 = TestData(test_input, test_output2, return_val, max_steps)
-        if not runner.test(func, test) and not runner.test(func, test2):
+        if not _passes_all(func, runner, self._hex_probe, PROBE_NUMS) and \
+                not _passes_all(func, runner, lambda num: self._hex_probe(num, upper=True), PROBE_NUMS):
             return False
 
-        num = random.randint(-(2 ** 26), 2 ** 26 - 1)
-        num = -abs(num)
-        s = str(num)
-        test_input = [num, "A"*15, 10]
-        test_output = [s, None, None]
-        return_val = None
-        max_steps = 10
-        test = TestData(test_input, test_output, return_val, max_steps)
-        if not runner.test(func, test):
-            self.is_signed = False
-        else:
-            self.is_signed = True
-
+        self.is_signed = _passes_all(func, runner, self._signed_probe, SIGNED_PROBE_NUMS)
         return True
@@ -30,6 +30,11 @@ class memcmp(Func):
     def can_call_other_funcs(self):
         return False
 
+    def necessary_tests(self):
+        bufa = "asd\x00a"
+        bufb = "asd\x00a"
+        return [TestData([bufa, bufb, 5], [None, None, None], 0, 10)]
+
     def pre_test(self, func, runner):
         # todo we don't test which order it returns the signs in
         l = random.randint(1, 20)
@@ -40,8 +45,8 @@ class memcmp(Func):
         max_steps = 10
         return_val = None
         test = TestData(test_input, test_output, return_val, max_steps)
-        s = runner.get_out_state(func, test)
-        if s is None or s.se.any_int(s.regs.eax) != 0:
+        r = runner.probe(func, test)
+        if r is None or r.return_val != 0:
             return False
 
         bufa = "asd\x00a"
@@ -49,21 +54,21 @@ class memcmp(Func):
         test_input = [bufa, bufb, 5]
         test_output = [bufa, bufb, 5]
         test = TestData(test_input, test_output, return_val, max_steps)
-        x = runner.get_out_state(func, test)
-        if x is None:
+        r = runner.probe(func, test)
+        if r is None or r.return_val is None:
             return False
-        outval1 = x.se.any_int(x.regs.eax)
+        outval1 = r.return_val
 
         bufa = "asd\x00c"
         bufb = "asd\x00b"
         test_input = [bufa, bufb, 5]
         test_output = [bufa, bufb, 5]
         test = TestData(test_input, test_output, return_val, max_steps)
-        s = runner.get_out_state(func, test)
-        if s is None:
+        r = runner.probe(func, test)
+        if r is None or r.return_val is None:
             return False
 
-        outval2 = s.se.any_int(s.regs.eax)
+        outval2 = r.return_val
 
         if outval1 != 0 or outval2 == 0:
             return False
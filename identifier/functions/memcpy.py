@@ -47,6 +47,14 @@ class memcpy(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
+    def necessary_tests(self):
+        # the first pretest
+        result_buf = "A" * 6
+        in_buf = "a\x00bbbc"
+        test_input = [result_buf, in_buf, 6]
+        test_output = [in_buf, in_buf, None]
+        return [TestData(test_input, test_output, None, 20)]
+
     def pre_test(self, func, runner):
 
         result_buf = "A" * 6
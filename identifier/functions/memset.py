@@ -41,5 +41,11 @@ class memset(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
+    def necessary_tests(self):
+        result_buf = "A"*10
+        test_input = [result_buf, ord("b"), 5]
+        test_output = ["b"*5 + result_buf[5:], None, None]
+        return [TestData(test_input, test_output, None, 20)]
+
     def pre_test(self, func, runner):
         return True
@@ -7,6 +7,60 @@ import logging
 l = logging.getLogger("identifier.functions.printf")
 
 
+# steps to explore the format string parsing for the characters it compares against
+GUARD_STEPS = 18
+# more possible specifiers than this are too many to test
+MAX_SPECIFIERS = 10
+
+
+def format_chars(func, runner, test_input, printable_only=True):
+    """
+    Finds the characters the function compares the characters of its format string against
+    :param test_input:      the arguments of the call, with a symbolic format string
+    :param printable_only:  only keep specifiers that are printable and not whitespace
+    :return: (possible format specifiers, possible conversion characters), or None if there are too many to test
+    """
+    test = TestData(test_input, [None] * len(test_input), None, GUARD_STEPS)
+    interesting_chars = set(chr(a) for a in runner.guard_constants(func, test, GUARD_STEPS) if 0 < a < 0x80)
+    alphanum = set(string.ascii_letters + string.digits)
+    possible_format_specifiers = [c for c in interesting_chars if c not in alphanum]
+    if printable_only:
+        possible_format_specifiers = [c for c in possible_format_specifiers
+                                      if c in string.printable and c not in string.whitespace]
+    possible_formats = [c for c in interesting_chars if c in alphanum]
+
+    if len(possible_format_specifiers) > MAX_SPECIFIERS:
+        return None
+    return possible_format_specifiers, possible_formats
+
+
+def find_format_spec(func, runner, chars, make_test, max_steps=20, brute_force_steps=10):
+    """
+    Finds the format specifier and the conversion character for strings, trying the compared characters first and
+    then brute forcing the conversion character. What is found is kept in the runner, so other printf candidates of
+    the same function check it first, and search again if it doesn't work for them.
+    :param chars:       the (specifiers, conversion characters) from format_chars
+    :param make_test:   takes a format string and max_steps, returns the TestData printing the string argument with it
+    :return: (format spec char, string spec char), or None
+    """
+    known = runner.format_specs.get(func.addr)
+    if known is not None:
+        if runner.test(func, make_test(known[0] + known[1] + "\n\x00", max(max_steps, brute_force_steps))):
+            return known
+        del runner.format_specs[func.addr]
+
+    possible_format_specifiers, possible_formats = chars
+    guesses = [(char, cc, max_steps) for char in possible_format_specifiers for cc in possible_formats]
+    # brute force...
+    guesses += [(char, cc, brute_force_steps) for char in possible_format_specifiers
+                for cc in string.ascii_lowercase if cc not in possible_formats]
+    i = runner.first_passing(func, (make_test(char + cc + "\n\x00", steps) for char, cc, steps in guesses))
+    if i is None:
+        return None
+    runner.format_specs[func.addr] = guesses[i][:2]
+    return guesses[i][:2]
+
+
 class printf(Func):
     non_null = [chr(i) for i in range(1, 256)]
 
@@ -49,69 +103,20 @@ class printf(Func):
         if not runner.test(func, test):
             return False
 
-        # find interesting characters
-        test_input = [claripy.BVS("input", 10*8)]
-        test_output = [None]
-        test = TestData(test_input, test_output, None, max_steps)
-        s = runner.get_base_call_state(func, test)
-        pg = runner.project.factory.path_group(s)
-        pg.step(18)
-        interesting_chars = set()
-        for p in pg.active:
-            for g in p.guards:
-                if g.op == "__ne__" or g.op == "__eq__":
-                    for a in g.args:
-                        if not a.symbolic:
-                            interesting_chars.add(s.se.any_int(a))
-
-        interesting_chars = set(chr(a) for a in interesting_chars if 0 < a < 0x80)
-        alphanum = set(string.ascii_letters + string.digits)
-        possible_format_specifiers = [c for c in interesting_chars if c not in alphanum and c in string.printable and c not in string.whitespace]
-        possible_formats = [c for c in interesting_chars if c in alphanum]
-
-        if len(possible_format_specifiers) > 10:
+        chars = format_chars(func, runner, [claripy.BVS("input", 10*8)])
+        if chars is None:
             # too many to test :(
             return False
 
-        # find the format specifier
         second_str = "findme"
-        for char in possible_format_specifiers:
-            if self.format_spec_char is not None:
-                break
-            for cc in possible_formats:
-                test_str = char + cc + "\n\x00"
-                test_input = [test_str, second_str]
-                test_output = [test_str, second_str]
-                stdout = second_str + "\n"
-                max_steps = 20
-                test = TestData(test_input, test_output, None, max_steps, expected_stdout=stdout)
-                if runner.test(func, test):
-                    self.format_spec_char = char
-                    self.string_spec_char = cc
-                    break
-
-        # brute force...
-        if self.format_spec_char is None:
-            second_str = "findme"
-            for char in possible_format_specifiers:
-                if self.format_spec_char is not None:
-                    break
-                for cc in string.ascii_lowercase:
-                    if cc in possible_formats:
-                        continue
-                    test_str = char + cc + "\n\x00"
-                    test_input = [test_str, second_str]
-                    test_output = [test_str, second_str]
-                    stdout = second_str + "\n"
-                    max_steps = 10
-                    test = TestData(test_input, test_output, None, max_steps, expected_stdout=stdout)
-                    if runner.test(func, test):
-                        self.format_spec_char = char
-                        self.string_spec_char = cc
-                        break
-
-        if self.format_spec_char is None:
+
+        def make_test(test_str, max_steps):
+            return TestData([test_str, second_str], [test_str, second_str], None, max_steps,
+                            expected_stdout=second_str + "\n")
+
+        spec = find_format_spec(func, runner, chars, make_test)
+        if spec is None:
             l.warning("format spec is none :(")
             return False
-
+        self.format_spec_char, self.string_spec_char = spec
         return True
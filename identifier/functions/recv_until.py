@@ -1,8 +1,11 @@
 from ..func import Func, TestData
 import random
-import itertools
 
 from ..errors import FunctionNotInitialized
+from ..arg_roles import infer_arg_roles, rank_arg_orders, DEREF, COMPARED, BYTE
+
+import logging
+l = logging.getLogger("identifier.functions.recv_until")
 
 def rand_str(length, byte_list=None):
     if byte_list is None:
@@ -10,6 +13,27 @@ def rand_str(length, byte_list=None):
     return "".join(random.choice(byte_list) for _ in xrange(length))
 
 
+def try_arg_orders(match, func, runner, expected):
+    """
+    Runs the pretests of the Func with each order of its arguments, most likely first, and records how many
+    orders were tried in runner.arg_orders_tried
+    :param match:       the Func, with an arg_order and do_pretests
+    :param expected:    for each base argument the role it must show, or None
+    :return: True once an order passed the pretests
+    """
+    orders = rank_arg_orders(expected, infer_arg_roles(runner.project, match.func_info, match.blocks))
+    passed = False
+    tried = 0
+    for perm in orders:
+        tried += 1
+        match.arg_order = perm
+        if match.do_pretests(func, runner):
+            passed = True
+            break
+    l.debug("%s at %#x: tried %d of %d argument orders", match.__class__.__name__, func.addr, tried, len(orders))
+    runner.arg_orders_tried[(func.addr, match.__class__.__name__)] = tried, len(orders)
+    return passed
+
 # FIXME this can fail test 2
 # FIXME need a way to test these, ie run 1000 times test2
 class receive_until_fd(Func):
@@ -65,11 +89,8 @@ class receive_until_fd(Func):
         return test
 
     def pre_test(self, func, runner):
-        for perm in itertools.permutations(range(len(self.base_args()))):
-            self.arg_order = perm
-            if self.do_pretests(func, runner):
-                return True
-        return False
+        # fd buf end_char max_len
+        return try_arg_orders(self, func, runner, [None, DEREF, BYTE, COMPARED])
 
     def do_pretests(self, func, runner):
         test_input = [0, "A"*0x100, ord("X"), 40]
@@ -210,12 +231,8 @@ class receive_until(Func):
         return test
 
     def pre_test(self, func, runner):
-        for perm in itertools.permutations(range(len(self.base_args()))):
-            self.arg_order = perm
-            # print "trying arg order:", self.arg_order
-            if self.do_pretests(func, runner):
-                return True
-        return False
+        # buf end_char max_len
+        return try_arg_orders(self, func, runner, [DEREF, BYTE, COMPARED])
 
     def do_pretests(self, func, runner):
         test_input = ["A"*0x100, ord("X"), 40]
@@ -3,6 +3,8 @@ import random
 import string
 import claripy
 
+from .printf import format_chars, find_format_spec
+
 
 class snprintf(Func):
     non_null = [chr(i) for i in range(1, 256)]
@@ -47,66 +49,19 @@ class snprintf(Func):
         if not runner.test(func, test):
             return False
 
-        # find interesting characters
-        test_input = [outbuf, length, claripy.BVS("input", 10*8)]
-        test_output = [None, None, None]
-        test = TestData(test_input, test_output, None, max_steps)
-        s = runner.get_base_call_state(func, test)
-        pg = runner.project.factory.path_group(s)
-        pg.step(18)
-        interesting_chars = set()
-        for p in pg.active:
-            for g in p.guards:
-                if g.op == "__ne__" or g.op == "__eq__":
-                    for a in g.args:
-                        if not a.symbolic:
-                            interesting_chars.add(s.se.any_int(a))
-
-        interesting_chars = set(chr(a) for a in interesting_chars if 0 < a < 0x80)
-        alphanum = set(string.ascii_letters + string.digits)
-        possible_format_specifiers = [c for c in interesting_chars if c not in alphanum]
-        possible_formats = [c for c in interesting_chars if c in alphanum]
-
-        if len(possible_format_specifiers) > 10:
+        chars = format_chars(func, runner, [outbuf, length, claripy.BVS("input", 10*8)], printable_only=False)
+        if chars is None:
             # too many to test :(
             return False
 
-        # find the format specifier
         second_str = "findme"
-        for char in possible_format_specifiers:
-            if self.format_spec_char is not None:
-                break
-            for cc in possible_formats:
-                test_str = char + cc + "\n\x00"
-                test_input = [outbuf, 20, test_str, second_str]
-                test_output = [second_str + "\n" + "\x00", None, test_str, second_str]
-                max_steps = 10
-                test = TestData(test_input, test_output, None, max_steps)
-                if runner.test(func, test):
-                    self.format_spec_char = char
-                    self.string_spec_char = cc
-                    break
-
-        # brute force...
-        if self.format_spec_char is None:
-            second_str = "findme"
-            for char in possible_format_specifiers:
-                if self.format_spec_char is not None:
-                    break
-                for cc in string.ascii_lowercase:
-                    if cc in possible_formats:
-                        continue
-                    test_str = char + cc + "\n\x00"
-                    test_input = [outbuf, 20, test_str, second_str]
-                    test_output = [second_str + "\n" + "\x00", None, test_str, second_str]
-                    max_steps = 10
-                    test = TestData(test_input, test_output, None, max_steps)
-                    if runner.test(func, test):
-                        self.format_spec_char = char
-                        self.string_spec_char = cc
-                        break
-
-        if self.format_spec_char is None:
-            return False
 
+        def make_test(test_str, max_steps):
+            test_output = [second_str + "\n" + "\x00", None, test_str, second_str]
+            return TestData([outbuf, 20, test_str, second_str], test_output, None, max_steps)
+
+        spec = find_format_spec(func, runner, chars, make_test, max_steps=10, brute_force_steps=10)
+        if spec is None:
+            return False
+        self.format_spec_char, self.string_spec_char = spec
         return True
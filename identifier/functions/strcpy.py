@@ -41,5 +41,9 @@ class strcpy(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
+    def necessary_tests(self):
+        buf = "abcdefg\x00"
+        return [TestData(["A"*8, buf], [buf, buf], None, 20)]
+
     def pre_test(self, func, runner):
         return True
@@ -16,6 +16,10 @@ class strlen(Func):
     def get_name(self):
         return "strlen"
 
+    def necessary_tests(self):
+        s = "abcdefgh\x00ijk"
+        return [TestData([s], [s], 8, 20)]
+
     def gen_input_output_pair(self):
         length = random.randint(2, 100)
         s = self.rand_str(length, strlen.non_null) + "\x00" + self.rand_str(length)
@@ -46,6 +46,12 @@ class strncpy(Func):
         test = TestData(test_input, test_output, return_val, max_steps)
         return test
 
+    def necessary_tests(self):
+        # the first pretest
+        test_input = ["A"*7, "abc\x00ccc", 7]
+        test_output = ["abc\x00AAA", "abc\x00ccc", None]
+        return [TestData(test_input, test_output, None, 5)]
+
     def pre_test(self, func, runner):
 
         # check only copies up to null
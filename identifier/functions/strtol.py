@@ -54,6 +54,10 @@ class strtol(Func):
         max_steps = 20
         return TestData(test_input, test_output, return_val, max_steps)
 
+    def necessary_tests(self):
+        s = "1234567"
+        return [TestData([s, 0, 10], [s, None, None], 1234567, 20)]
+
     def pre_test(self, func, runner):
         num = random.randint(-(2 ** 31), 2 ** 31 - 1)
 
@@ -1,24 +1,81 @@
 from angrop import rop_utils
 
-from collections import defaultdict
+from collections import defaultdict, Mapping
 
-from functions import Functions
+from functions import Functions, get_candidates
 from errors import IdentifierException
 from runner import Runner
+from cache import DiskCache
+from stack_offsets import StackOffsets, base_value, reg_name
+from block_cache import BlockCache
+import syscalls
 import simuvex
 import angr
 from simuvex.s_errors import SimEngineError, SimMemoryError
 import os
+import re
+import random
+import itertools
+import multiprocessing
 
+import networkx
 from networkx import NetworkXError
 
 import logging
 l = logging.getLogger("identifier.identify")
 
 
+# random tests run on a candidate no other family was confused with, the pretests already single it out
+MIN_RANDOM_TESTS = 2
+# random tests run on a candidate other families could be confused with
 NUM_TESTS = 5
+# the most random tests run on a candidate
+MAX_RANDOM_TESTS = 12
+
+# number of FuncInfo results kept in the on-disk cache
+FUNC_INFO_CACHE_ENTRIES = 100000
+# bump this when the stack analysis changes, it invalidates the cached FuncInfo
+FUNC_INFO_VERSION = 2
+# number of identification results kept in the on-disk cache
+MATCH_CACHE_ENTRIES = 100000
+# bump this when the tests of the Func classes change, it invalidates the cached matches
+MATCH_VERSION = 2
+# number of lifted blocks, and of the facts found from them, kept in memory
+BLOCK_CACHE_ENTRIES = 20000
+
+_hex_const_re = re.compile(r"0x[0-9a-f]+")
+
+# the identifier the pool workers use, it is inherited when the pool forks
+_pool_identifier = None
+
+
+def _init_identify_worker():
+    # forked workers start with the same random state, reseed so they generate different tests
+    random.seed()
+    syscalls.seed()
+
+
+def _identify_worker(addr):
+    idfer = _pool_identifier
+    func = idfer._cfg.functions[addr]
+    match = idfer.identify_func(func)
+    # matches can hold the runner, only their class and attributes are sent back like in the match cache
+    if match is not None:
+        match = match.__class__.__name__, match.match_attrs()
+    # send back the stack analysis too, so the parent doesn't redo it
+    return addr, match, idfer.emulation_counts.get(addr, 0), idfer.test_decisions.get(addr, None), \
+        idfer.func_info.computed(func)
+
+
+def _func_info_worker(addr):
+    idfer = _pool_identifier
+    return addr, idfer._compute_func_info(idfer._cfg.functions[addr])
+
 
 class FuncInfo(object):
+    _fields = ("stack_vars", "stack_var_accesses", "frame_size", "pushed_regs", "stack_args", "stack_arg_accesses",
+               "buffers", "var_args", "bp_based", "bp_sp_diff", "accesses_ret", "preamble_sp_change")
+
     def __init__(self):
         self.stack_vars = None
         self.stack_var_accesses = None
@@ -33,22 +90,127 @@ class FuncInfo(object):
         self.accesses_ret = None
         self.preamble_sp_change = None
 
+    def rebased(self, delta):
+        """
+        :return: a copy with the instruction addresses of the accesses moved by delta
+        """
+        info = FuncInfo()
+        info.__setstate__(self.__getstate__())
+        info.stack_var_accesses = self._rebase_accesses(self.stack_var_accesses, delta)
+        info.stack_arg_accesses = self._rebase_accesses(self.stack_arg_accesses, delta)
+        return info
+
+    @staticmethod
+    def _rebase_accesses(accesses, delta):
+        rebased = defaultdict(set)
+        for off, v in accesses.items():
+            rebased[off] = set((addr + delta, action) for addr, action in v)
+        return rebased
+
+    def __getstate__(self):
+        # pickled as a plain tuple, so sending it between processes stays cheap
+        return tuple(getattr(self, f) for f in FuncInfo._fields)
+
+    def __setstate__(self, state):
+        for f, v in zip(FuncInfo._fields, state):
+            setattr(self, f, v)
+
+
+class FuncInfoMap(Mapping):
+    """
+    The FuncInfo of each function the stack analysis applies to, computed the first time it is asked for.
+    Functions the analysis skipped or failed on have no entry. Iterating only gives the functions analyzed so far,
+    Identifier.compute_func_info analyzes the rest.
+    """
+
+    def __init__(self, identifier, funcs):
+        """
+        :param identifier:  the Identifier that computes the FuncInfo
+        :param funcs:       the functions the stack analysis applies to
+        """
+        self._identifier = identifier
+        self._funcs = set(funcs)
+        # function to FuncInfo, or None if the analysis failed
+        self._infos = dict()
+
+    def __getitem__(self, func):
+        if func not in self._funcs:
+            raise KeyError(func)
+        if func not in self._infos:
+            self._infos[func] = self._identifier._compute_func_info(func)
+        func_info = self._infos[func]
+        if func_info is None:
+            raise KeyError(func)
+        return func_info
+
+    def __iter__(self):
+        for func in sorted(self._infos, key=lambda f: f.addr):
+            if self._infos[func] is not None:
+                yield func
+
+    def __len__(self):
+        return sum(1 for func_info in self._infos.values() if func_info is not None)
+
+    def computed(self, func):
+        """
+        :return: (FuncInfo,) or (None,) if the analysis of the function ran, otherwise None
+        """
+        if func not in self._infos:
+            return None
+        return self._infos[func],
+
+    def put(self, func, func_info):
+        """
+        Stores a FuncInfo computed somewhere else, such as in a pool worker
+        """
+        if func in self._funcs:
+            self._infos[func] = func_info
+
+    def pending(self, funcs=None):
+        """
+        :return: the functions, of funcs or of all of them, whose analysis hasn't run yet
+        """
+        if funcs is None:
+            funcs = self._funcs
+        return [f for f in funcs if f in self._funcs and f not in self._infos]
+
 
 class Identifier(object):
 
     _special_case_funcs = ["free"]
 
-    def __init__(self, project, cfg=None, require_predecessors=True, only_find=None):
+    def __init__(self, project, cfg=None, require_predecessors=True, only_find=None, cache_dir=None, workers=1,
+                 verify_cached_matches=False, native=False, early_abort=False):
         self.project = project
         if cfg is not None:
             self._cfg = cfg
         else:
             self._cfg = project.analyses.CFGFast(resolve_indirect_jumps=True)
-        self._runner = Runner(project, self._cfg)
+
+        # persistent caches shared between runs live under cache_dir
+        self.cache_dir = cache_dir
+        snapshot_dir = None
+        self._func_info_cache = None
+        self._match_cache = None
+        if cache_dir is not None:
+            snapshot_dir = os.path.join(cache_dir, "snapshots")
+            self._func_info_cache = DiskCache(os.path.join(cache_dir, "func_info"),
+                                              max_entries=FUNC_INFO_CACHE_ENTRIES)
+            self._match_cache = DiskCache(os.path.join(cache_dir, "matches"), max_entries=MATCH_CACHE_ENTRIES)
+        # run one test on matches found in the cache before trusting them
+        self.verify_cached_matches = verify_cached_matches
+        self._normalized_hashes = dict()
+        # function address to the component of the callgraph it is in, built on first use
+        self._call_sccs = None
+        self._runner = Runner(project, self._cfg, snapshot_dir=snapshot_dir, native=native, early_abort=early_abort)
+        self._blocks = BlockCache(project, BLOCK_CACHE_ENTRIES)
 
         # only find if in this set
         self.only_find = only_find
 
+        # number of processes used for the stack analysis and by run()
+        self.workers = workers
+
         # reg list
         a = self.project.arch
         self._sp_reg = a.register_names[a.sp_offset]
@@ -59,10 +221,18 @@ class Identifier(object):
         self._reg_list = filter(lambda r: r != self._ip_reg, self._reg_list)
 
         self.matches = dict()
+        # number of emulations identify_func used for each function address
+        self.emulation_counts = dict()
+        # (number of random tests, reason to stop) for each matched function address
+        self.test_decisions = dict()
+        # the most random tests a candidate of each Func passed on a function it turned out not to be,
+        # measured in this process
+        self._confusion = dict()
 
         self.callsites = None
         self.inv_callsites = None
-        self.func_info = dict()
+        # computed on first access, see compute_func_info to do it ahead of time
+        self.func_info = FuncInfoMap(self, [])
         self.block_to_func = dict()
 
         self.map_callsites()
@@ -75,6 +245,7 @@ class Identifier(object):
         self.base_symbolic_state.options.discard(simuvex.o.SUPPORT_FLOATING_POINT)
         self.base_symbolic_state.regs.bp = self.base_symbolic_state.se.BVS("sreg_" + "ebp" + "-", self.project.arch.bits)
 
+        funcs = []
         for f in self._cfg.functions.values():
             if f.is_syscall:
                 continue
@@ -88,33 +259,99 @@ class Identifier(object):
             except NetworkXError:
                 if require_predecessors:
                     continue
+            funcs.append(f)
 
-            # find the actual vars
-            try:
-                func_info = self.find_stack_vars_x86(f)
-                self.func_info[f] = func_info
-            except (SimEngineError, SimMemoryError) as ex:
-                l.debug("angr translation error: %s", ex.message)
-            except IdentifierException as e:
-                l.debug("Identifier Exception: %s", e.message)
+        self.func_info = FuncInfoMap(self, funcs)
+
+    def compute_func_info(self, funcs=None, workers=None):
+        """
+        Runs the stack analysis ahead of time instead of on first access
+        :param funcs:   the functions to analyze, defaults to all of them
+        :param workers: number of processes to analyze them with, defaults to the number the Identifier was created with
+        """
+        if workers is None:
+            workers = self.workers
+        funcs = self.func_info.pending(funcs)
+
+        if workers > 1:
+            func_infos = self._map_in_pool(_func_info_worker, [f.addr for f in funcs], workers)
+            func_infos = ((self._cfg.functions[addr], func_info) for addr, func_info in func_infos)
+        else:
+            func_infos = ((f, self._compute_func_info(f)) for f in funcs)
+
+        for f, func_info in func_infos:
+            self.func_info.put(f, func_info)
+
+    def _compute_func_info(self, func):
+        """
+        :return: the FuncInfo of the function or None if the stack analysis failed
+        """
+        key = None
+        try:
+            if self._func_info_cache is not None:
+                key = self._func_info_key(func)
+                cached = self._func_info_cache.get(key)
+                if cached is not None:
+                    # failed analyses are cached as (None,)
+                    func_info, = cached
+                    return func_info.rebased(func.addr) if func_info is not None else None
+
+            func_info = self.find_stack_vars_x86(func)
+        except (SimEngineError, SimMemoryError) as ex:
+            l.debug("angr translation error: %s", ex.message)
+            func_info = None
+        except IdentifierException as e:
+            l.debug("Identifier Exception: %s", e.message)
+            func_info = None
+
+        if key is not None:
+            # store it relative to the function address so copies of the function at other addresses hit
+            self._func_info_cache.put(key, (func_info.rebased(-func.addr) if func_info is not None else None,))
+        return func_info
+
+    def _func_info_key(self, func):
+        """
+        The stack analysis only depends on the bytes of the function and the layout of its blocks,
+        so the key is built from those relative to the function address
+        """
+        layout = []
+        for addr in sorted(func.block_addrs_set):
+            bl = func._get_block(addr)
+            layout.append((addr - func.addr, bl.size, bl.bytes.encode("hex")))
+        ends = sorted(b.addr - func.addr for b in func.endpoints)
+        start = func.startpoint.addr - func.addr if func.startpoint is not None else None
+        return DiskCache.make_key(FUNC_INFO_VERSION, self.project.arch.name, start, layout, ends)
 
     def _too_large(self):
         if len(self._cfg.functions) > 400:
             return True
         return False
 
-    def run(self, only_find=None):
+    def run(self, only_find=None, workers=None):
+        """
+        :param only_find:   if set, only try to identify functions with these names,
+                            free is looked for whenever malloc was found
+        :param workers:     number of processes to identify functions with, the pool is forked so the
+                            workers share the cfg and the func_info computed so far with this process.
+                            Defaults to the number the Identifier was created with.
+        :return: a generator of (address, name) for each identified function
+        """
         if only_find is not None:
             self.only_find = only_find
+        if workers is None:
+            workers = self.workers
 
         if self._too_large():
             l.warning("Too large")
             return
 
-        for f in self._cfg.functions.values():
-            if f.is_syscall:
-                continue
-            match = self.identify_func(f)
+        funcs = [f for f in self._cfg.functions.values() if not f.is_syscall]
+        if workers > 1:
+            matches = self._identify_parallel(funcs, workers)
+        else:
+            matches = ((f, self.identify_func(f)) for f in funcs)
+
+        for f, match in matches:
             if match is not None:
                 match_func = match
                 match_name = match_func.get_name()
@@ -134,16 +371,18 @@ class Identifier(object):
         # Special case functions
         for name in Identifier._special_case_funcs:
             func = Functions[name]()
+            # checked before the stack analysis of every unmatched function is needed
+            if not func.can_match(self):
+                continue
             for f in self._cfg.functions.values():
                 if f in self.matches:
                     continue
-                if f not in self.func_info:
+                func_info = self.get_func_info(f)
+                if func_info is None:
                     continue
-                if self.func_info[f] is None:
+                if len(func_info.stack_args) != func.num_args():
                     continue
-                if len(self.func_info[f].stack_args) != func.num_args():
-                    continue
-                if self._non_normal_args(self.func_info[f].stack_args):
+                if self._non_normal_args(func_info.stack_args):
                     continue
                 try:
                     result = func.try_match(f, self, self._runner)
@@ -175,6 +414,62 @@ class Identifier(object):
         for f in to_remove:
             del self.matches[f]
 
+        for name, (hits, misses) in sorted(self.cache_stats().items()):
+            l.debug("%s cache: %d hits, %d misses", name, hits, misses)
+        for name, (runs, fallbacks) in sorted(self._runner.backend_stats().items()):
+            l.debug("%s: ran %d calls, %d fell back", name, runs, fallbacks)
+        if self._runner.early_abort:
+            l.debug("stopped %d tests early, saving up to %d steps", *self._runner.abort_stats())
+        if self._runner.arg_orders_tried:
+            tried = self._runner.arg_orders_tried.values()
+            l.debug("tried %d of %d argument orders", sum(t for t, _ in tried), sum(n for _, n in tried))
+
+    def cache_stats(self):
+        """
+        :return: a dict of cache name to (hits, misses), for the runner's caches and the lifted blocks
+        """
+        stats = self._runner.cache_stats()
+        stats.update(self._blocks.stats())
+        return stats
+
+    def _identify_parallel(self, funcs, workers):
+        """
+        Runs identify_func for each function in a forked process pool
+        :return: a generator of (function, match) in the order the workers finish
+        """
+        # build the base state before forking so the workers don't each rebuild it
+        self._runner._get_base_state()
+
+        for addr, match, emulations, decision, computed in self._map_in_pool(_identify_worker,
+                                                                             [f.addr for f in funcs], workers):
+            self.emulation_counts[addr] = emulations
+            if decision is not None:
+                self.test_decisions[addr] = decision
+            if computed is not None:
+                self.func_info.put(self._cfg.functions[addr], computed[0])
+            if match is not None:
+                match = self._make_match(*match)
+            yield self._cfg.functions[addr], match
+
+    def _map_in_pool(self, worker, addrs, workers):
+        """
+        Maps a module level worker over the function addresses in a pool forked from this process,
+        the worker reaches this identifier through _pool_identifier
+        :return: a generator of the worker results in the order they finish
+        """
+        global _pool_identifier
+
+        _pool_identifier = self
+        pool = multiprocessing.Pool(workers, initializer=_init_identify_worker)
+        try:
+            for r in pool.imap_unordered(worker, addrs):
+                yield r
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            _pool_identifier = None
+
     def can_call_same_name(self, addr, name):
         if addr not in self._cfg.functions.callgraph.nodes():
             return False
@@ -196,11 +491,13 @@ class Identifier(object):
         return False
 
     def get_func_info(self, func):
+        """
+        :param func:    the function or its address
+        :return: the FuncInfo of the function, running the stack analysis the first time, or None if it has none
+        """
         if isinstance(func, (int, long)):
             func = self._cfg.functions[func]
-        if func not in self.func_info:
-            return None
-        return self.func_info[func]
+        return self.func_info.get(func)
 
     @staticmethod
     def constrain_all_zero(before_state, state, regs):
@@ -208,9 +505,19 @@ class Identifier(object):
             state.add_constraints(before_state.registers.load(r) == 0)
 
     def identify_func(self, function):
+        start = self._runner.emulations
+        try:
+            return self._identify_func(function)
+        finally:
+            self.emulation_counts[function.addr] = self._runner.emulations - start
+
+    def _identify_func(self, function):
         l.debug("function at %#x", function.addr)
         if function.is_syscall:
             return None
+        if not self._looking_for_candidates():
+            # don't run the stack analysis when there is nothing it could be matched against
+            return None
 
         func_info = self.get_func_info(function)
         if func_info is None:
@@ -219,28 +526,48 @@ class Identifier(object):
 
         l.debug("num args %d", len(func_info.stack_args))
 
+        key = None
+        if self._match_cache is not None:
+            try:
+                key = self._match_key(function, func_info)
+            except (SimEngineError, SimMemoryError) as ex:
+                l.debug("angr translation error hashing function: %s", ex.message)
+        if key is not None:
+            cached = self._match_cache.get(key)
+            if cached is not None:
+                hit, match = self._use_cached_match(function, cached)
+                if hit:
+                    return match
+
+        match = self._find_match(function, func_info)
+
+        # a missing match only means something if we looked for all of the functions
+        if key is not None and (match is not None or self.only_find is None):
+            if match is not None:
+                self._match_cache.put(key, (match.__class__.__name__, match.match_attrs()))
+            else:
+                self._match_cache.put(key, (None, None))
+        return match
+
+    def _find_match(self, function, func_info):
         try:
             calls_other_funcs = len(self._cfg.functions.callgraph.successors(function.addr)) > 0
         except NetworkXError:
             calls_other_funcs = False
 
-        for name, f in Functions.iteritems():
-            # check if we should be finding it
-            if self.only_find is not None and name not in self.only_find:
-                continue
-            if name in Identifier._special_case_funcs:
-                continue
+        candidates = get_candidates(len(func_info.stack_args), func_info.var_args, calls_other_funcs)
+        # check if we should be finding it
+        candidates = [name for name in candidates if self.only_find is None or name in self.only_find]
+        candidates = [name for name in candidates if name not in Identifier._special_case_funcs]
+        # the candidates left, including those without necessary tests, the function behaves like any of them so far
+        candidates = self._filter_candidates(function, candidates)
 
+        for name in candidates:
             # generate an object of the class
-            f = f()
+            f = Functions[name]()
             # test it
-            if f.num_args() != len(func_info.stack_args) or f.var_args() != func_info.var_args:
-                continue
-            if calls_other_funcs and not f.can_call_other_funcs():
-                continue
-
             l.debug("testing: %s", name)
-            if not self.check_tests(function, f):
+            if not self.check_tests(function, f, rivals=[r for r in candidates if r != name]):
                 continue
             # match!
             return f
@@ -252,14 +579,231 @@ class Identifier(object):
 
         return None
 
-    def check_tests(self, cfg_func, match_func):
+    def _use_cached_match(self, function, cached):
+        """
+        :param cached:  the (class name, attributes) tuple from the match cache
+        :return: a tuple of whether the cached result can be used, and the match
+        """
+        name, attrs = cached
+        if name is None:
+            return True, None
+        if name not in Functions:
+            return False, None
+        if self.only_find is not None and name not in self.only_find:
+            return True, None
+
+        match = self._make_match(name, attrs)
+        if self.verify_cached_matches:
+            try:
+                test_data = match.gen_input_output_pair()
+                # functions without random tests can't be verified cheaply, we trust the cache for those
+                if test_data is not None and not self._runner.test(function, test_data):
+                    l.warning("cached match %s failed verification for %#x", name, function.addr)
+                    return False, None
+            except simuvex.SimError as e:
+                l.warning("SimError %s", e.message)
+                return False, None
+            except angr.AngrError as e:
+                l.warning("AngrError %s", e.message)
+                return False, None
+        l.debug("using cached match %s for %#x", name, function.addr)
+        return True, match
+
+    @staticmethod
+    def _make_match(name, attrs):
+        """
+        :return: the Func named name with the attributes of a match found elsewhere
+        """
+        match = Functions[name]()
+        match.set_match_attrs(attrs)
+        return match
+
+    def _match_key(self, function, func_info):
+        return DiskCache.make_key(MATCH_VERSION, self.project.arch.name, ",".join(sorted(Functions)),
+                                  len(func_info.stack_args), func_info.var_args,
+                                  self._normalized_hash(function))
+
+    def _normalized_hash(self, function):
+        """
+        A position independent hash of the function and everything it calls.
+        Addresses in the instructions are replaced by an offset if they point into the function,
+        and masked out if they point anywhere else in the binary.
+        Functions that call each other are hashed together as their strongly connected component of the callgraph,
+        so the hash doesn't depend on which of them was hashed first.
+        """
+        if function.addr in self._normalized_hashes:
+            return self._normalized_hashes[function.addr]
+
+        members = self._call_scc(function.addr)
+        callees = set()
+        for addr in members:
+            try:
+                callees.update(self._cfg.functions.callgraph.successors(addr))
+            except NetworkXError:
+                pass
+        # every callee outside of the component is hashed before it, there is no cycle between components
+        callee_hashes = sorted(self._normalized_hash(self._cfg.functions[c])
+                               for c in callees - members if c in self._cfg.functions)
+        bodies = dict((addr, self._normalized_body(self._cfg.functions[addr])) for addr in members)
+        scc_hash = DiskCache.make_key(sorted(bodies.values()), callee_hashes)
+
+        for addr in members:
+            self._normalized_hashes[addr] = DiskCache.make_key(bodies[addr], scc_hash)
+        return self._normalized_hashes[function.addr]
+
+    def _call_scc(self, addr):
+        """
+        :return: the set of function addresses in the strongly connected component of the callgraph with addr
+        """
+        if self._call_sccs is None:
+            self._call_sccs = dict()
+            for scc in networkx.strongly_connected_components(self._cfg.functions.callgraph):
+                scc = frozenset(a for a in scc if a in self._cfg.functions)
+                for a in scc:
+                    self._call_sccs[a] = scc
+        return self._call_sccs.get(addr, frozenset([addr]))
+
+    def _normalized_body(self, function):
+        """
+        :return: the normalized instructions of the function, without its callees
+        """
+        if function.is_syscall or self.project.is_hooked(function.addr):
+            return "external " + str(function.name)
+
+        main_bin = self.project.loader.main_bin
+        min_addr = main_bin.get_min_addr()
+        max_addr = main_bin.get_max_addr()
+        func_start = min(function.block_addrs_set)
+        func_end = max(b.addr + b.size for b in function.graph.nodes())
+
+        def normalize(m):
+            val = int(m.group(0), 16)
+            if func_start <= val < func_end:
+                return "F+%#x" % (val - function.addr)
+            if min_addr <= val <= max_addr:
+                return "ADDR"
+            return m.group(0)
+
+        insns = []
+        for addr in sorted(function.block_addrs_set):
+            insns.append("block %#x" % (addr - function.addr))
+            for insn in function._get_block(addr).capstone.insns:
+                insns.append(insn.mnemonic + " " + _hex_const_re.sub(normalize, insn.op_str))
+        return "\n".join(insns)
+
+    def _looking_for_candidates(self):
+        """
+        :return: False if only_find leaves nothing for _find_match to test
+        """
+        if self.only_find is None:
+            return True
+        return any(name not in Identifier._special_case_funcs for name in self.only_find)
+
+    def _filter_candidates(self, function, names):
+        """
+        Rules out candidates with their necessary tests.
+        Each step runs the test inputs that split the remaining candidates the most, so a function that is none of
+        them is usually rejected after a few runs.
+        :return: the names of the candidates that passed all of their necessary tests, in the same order
+        """
+        pending = dict()
+        for name in names:
+            pending[name] = list(Functions[name]().necessary_tests())
+        remaining = set(names)
+
+        while True:
+            # group the pending tests by their inputs, candidates with the same inputs share a run
+            by_inputs = defaultdict(list)
+            for name in remaining:
+                for test_data in pending[name]:
+                    key = self._runner._fingerprint(function, test_data, False)
+                    if key is None:
+                        # the run isn't deterministic, or its inputs can't be compared, so it can't be shared
+                        key = ("unshared", name, id(test_data))
+                    by_inputs[key].append((name, test_data))
+            if len(by_inputs) == 0:
+                break
+
+            inputs = max(by_inputs, key=lambda k: self._split_score(by_inputs[k]))
+            try:
+                result = self._runner.probe(function, by_inputs[inputs][0][1])
+            except simuvex.SimSegfaultError:
+                result = None
+            except (simuvex.SimError, angr.AngrError) as e:
+                l.warning("error running necessary tests: %s", e.message)
+                result = None
+
+            for name, test_data in by_inputs[inputs]:
+                pending[name].remove(test_data)
+                if not self._passes(function, test_data, result):
+                    l.debug("ruled out %s", name)
+                    remaining.discard(name)
+
+        return [name for name in names if name in remaining]
+
+    def _passes(self, function, test_data, probe_result):
+        if probe_result is None:
+            return False
+        passed = probe_result.matches(test_data, self.project.arch.bits)
+        if passed is not None:
+            return passed
+
+        # the probe didn't record enough of the outputs, run the test itself
         try:
-            if not match_func.pre_test(cfg_func, self._runner):
+            return self._runner.test(function, test_data)
+        except simuvex.SimSegfaultError:
+            return False
+        except (simuvex.SimError, angr.AngrError) as e:
+            l.warning("error running necessary tests: %s", e.message)
+            return False
+
+    @staticmethod
+    def _split_score(tests):
+        """
+        :param tests:   the (candidate name, TestData) pairs sharing the same inputs
+        :return: a score for running the inputs, the number of candidates ruled out at least whatever the
+                 outcome, then the number of candidates the run can rule out
+        """
+        expectations = defaultdict(int)
+        for _, test_data in tests:
+            expectations[(tuple(test_data.expected_output_args), test_data.expected_return_val,
+                          test_data.expected_stdout)] += 1
+        return len(tests) - max(expectations.values()), len(tests)
+
+    def check_tests(self, cfg_func, match_func, rivals=()):
+        """
+        :param rivals:  the names of the other candidates left after _filter_candidates
+        :return: True if the function passed the pretests and random tests of the candidate
+        """
+        try:
+            match_func.func_info = self.get_func_info(cfg_func)
+            match_func.blocks = self._blocks
+            try:
+                passed_pre_test = match_func.pre_test(cfg_func, self._runner)
+            finally:
+                # only pre_test uses them, keep them out of the match cache
+                del match_func.func_info
+                del match_func.blocks
+            if not passed_pre_test:
                 return False
-            for i in xrange(NUM_TESTS):
-                test_data = match_func.gen_input_output_pair()
-                if test_data is not None and not self._runner.test(cfg_func, test_data):
+
+            num_tests, reason = self.random_tests_needed(match_func, rivals)
+            first_test = match_func.gen_input_output_pair() if num_tests > 0 else None
+            if first_test is None:
+                if num_tests > 0:
+                    reason = "no random tests"
+                num_tests = 0
+            else:
+                # generated lazily, test_many stops at the first failure
+                tests = itertools.chain([first_test],
+                                        (match_func.gen_input_output_pair() for _ in xrange(num_tests - 1)))
+                outcomes = self._runner.test_many(cfg_func, tests)
+                if not all(o.passed for o in outcomes):
+                    self._record_confusion(match_func, len(outcomes) - 1)
                     return False
+
+            l.debug("accepted %s after %d random tests: %s", match_func.__class__.__name__, num_tests, reason)
+            self.test_decisions[cfg_func.addr] = (num_tests, reason)
             return True
         except simuvex.SimSegfaultError:
             return False
@@ -270,6 +814,37 @@ class Identifier(object):
             l.warning("AngrError %s", e.message)
             return False
 
+    def random_tests_needed(self, match_func, rivals=()):
+        """
+        The count comes from the confusion measured between candidate families. A candidate that no other family
+        was confused with gets MIN_RANDOM_TESTS. One with rivals, other candidates the filter didn't rule out, gets
+        NUM_TESTS.
+        Once a wrong candidate of the family passed some random tests, passing that many proves nothing,
+        so NUM_TESTS more are run, up to MAX_RANDOM_TESTS.
+        :param rivals:  the names of the other candidates left after _filter_candidates
+        :return: the number of random tests to run on the candidate, and why that many
+        """
+        survived = self._confusion.get(match_func.__class__.__name__, None)
+        if survived is None and len(rivals) == 0:
+            return MIN_RANDOM_TESTS, "no confusion"
+
+        num_tests = NUM_TESTS
+        reason = "confusable with %s" % ", ".join(sorted(rivals)) if rivals else "confusable"
+        if survived is not None:
+            num_tests += survived
+            reason = "a wrong match passed the pretests and %d random tests" % survived
+        if num_tests >= MAX_RANDOM_TESTS:
+            return MAX_RANDOM_TESTS, "max tests"
+        return num_tests, reason
+
+    def _record_confusion(self, match_func, passed):
+        """
+        Records a candidate that passed the pretests of a function it isn't
+        :param passed:  the number of random tests it passed before one failed
+        """
+        name = match_func.__class__.__name__
+        self._confusion[name] = max(self._confusion.get(name, 0), passed)
+
     def map_callsites(self):
         callsites = dict()
         for f in self._cfg.functions.values():
@@ -399,24 +974,8 @@ class Identifier(object):
 
         return args, args_as_stack_vars
 
-    @staticmethod
-    def get_reg_name(arch, reg_offset):
-        """
-        :param arch: the architecture
-        :param reg_offset: Tries to find the name of a register given the offset in the registers.
-        :return: The register name
-        """
-        # todo does this make sense
-        if reg_offset is None:
-            return None
-
-        original_offset = reg_offset
-        while reg_offset >= 0 and reg_offset >= original_offset - (arch.bits/8):
-            if reg_offset in arch.register_names:
-                return arch.register_names[reg_offset]
-            else:
-                reg_offset -= 1
-        return None
+    # kept for callers of the old method, see stack_offsets.reg_name
+    get_reg_name = staticmethod(reg_name)
 
     @staticmethod
     def _make_regs_symbolic(input_state, reg_list, project):
@@ -435,16 +994,17 @@ class Identifier(object):
         return state
 
     def _prefilter_floats(self, func):
-
-        # calling _get_block() from `func` respects the size of the basic block
-        # in extreme cases (like at the end of a section where VEX cannot disassemble the instruction beyond the
-        # section boundary), directly calling project.factory.block() on func.addr may lead to an AngrTranslationError.
-        bl = func._get_block(func.addr).vex
-
-        if any(c.type.startswith("Ity_F") for c in bl.all_constants):
+        if self._blocks.has_float_consts(func):
             raise IdentifierException("floating const")
 
-    def find_stack_vars_x86(self, func):
+    def find_stack_vars_x86(self, func, per_instruction=False, static_offsets=True, per_prefix=False):
+        """
+        :param func:            the function or its address
+        :param per_instruction: step every instruction on its own instead of running each block once
+        :param static_offsets:  resolve the accesses that can be from the vex of their instruction, without the solver
+        :param per_prefix:      find the preamble by stepping each prefix of the first block from scratch
+        :return: the FuncInfo of the function, the same whichever way the accesses are found
+        """
 
         # could also figure out if args are buffers etc
         # doesn't handle dynamically allocated stack, etc
@@ -474,71 +1034,64 @@ class Identifier(object):
         initial_state.regs.ip = func.startpoint.addr
         initial_path = self.project.factory.path(initial_state)
 
-        # find index where stack value is constant
-        initial_path.step()
-        succ = (initial_path.successors + initial_path.unconstrained_successors)[0]
+        # step the first block once, an instruction at a time, everything about the preamble comes from that trace
+        start_block = self._blocks.block(func.startpoint.addr)
+        num_inst = start_block.instructions
+        trace, trace_actions = self._preamble_trace(initial_path, num_inst, per_prefix=per_prefix)
+        sps = [p.state.se.any_int(p.state.regs.sp) if p is not None else None for p in trace]
 
-        if succ.state.scratch.jumpkind == "Ijk_Call":
+        # find index where stack value is constant
+        succ = trace[num_inst]
+        if succ is None:
+            # the block errors, so there is no preamble to find
+            goal_sp = sps[0]
+        elif succ.state.scratch.jumpkind == "Ijk_Call":
             goal_sp = succ.state.se.any_int(succ.state.regs.sp + self.project.arch.bytes)
             # could be that this is wrong since we could be pushing args...
             # so let's do a hacky check for pushes after a sub
-            bl = self.project.factory.block(func.startpoint.addr)
             # find the sub sp
-            for i, insn in enumerate(bl.capstone.insns):
+            for i, insn in enumerate(start_block.capstone.insns):
                 if str(insn.mnemonic) == "sub" and str(insn.op_str).startswith("esp"):
-                    initial_path = self.project.factory.path(initial_state)
-                    initial_path.step(num_inst=i+1)
-                    succ = (initial_path.successors + initial_path.unconstrained_successors)[0]
-                    goal_sp = succ.state.se.any_int(succ.state.regs.sp)
+                    goal_sp = sps[i+1]
 
         elif succ.state.scratch.jumpkind == "Ijk_Ret":
             # here we need to know the min sp val
-            min_sp = initial_state.se.any_int(initial_state.regs.sp)
-            for i in xrange(self.project.factory.block(func.startpoint.addr).instructions):
-                test_p = self.project.factory.path(initial_state)
-                test_p.step(num_inst=i)
-                succ = (test_p.successors + test_p.unconstrained_successors)[0]
-                test_sp = succ.state.se.any_int(succ.state.regs.sp)
+            min_sp = sps[0]
+            for test_sp in sps[:num_inst]:
                 if test_sp < min_sp:
                     min_sp = test_sp
                 elif test_sp > min_sp:
                     break
             goal_sp = min_sp
         else:
-            goal_sp = succ.state.se.any_int(succ.state.regs.sp)
+            goal_sp = sps[num_inst]
 
         # find the end of the preamble
         num_preamble_inst = None
         succ = None
-        for i in xrange(0, self.project.factory.block(func.startpoint.addr).instructions):
-            test_p = self.project.factory.path(initial_state)
-            if i == 0:
-                succ = test_p
-            else:
-                test_p.step(num_inst=i)
-                succ = (test_p.successors + test_p.unconstrained_successors)[0]
-            test_sp = succ.state.se.any_int(succ.state.regs.sp)
-            if test_sp == goal_sp:
+        for i in xrange(0, num_inst):
+            if sps[i] == goal_sp:
                 num_preamble_inst = i
+                succ = trace[i]
                 break
+        if num_preamble_inst is None:
+            raise IdentifierException("preamble checks failed for %#x" % func.startpoint.addr)
 
         # hacky check for mov ebp esp
         # happens when this is after the pushes...
         if num_preamble_inst == 0:
             end_addr = func.startpoint.addr
         else:
-            end_addr = func.startpoint.addr + self.project.factory.block(func.startpoint.addr, num_inst=num_preamble_inst).size
+            end_addr = func.startpoint.addr + self._blocks.block(func.startpoint.addr, num_inst=num_preamble_inst).size
         if self._sets_ebp_from_esp(initial_state, end_addr):
             num_preamble_inst += 1
-            test_p = self.project.factory.path(initial_state)
-            test_p.step(num_inst=num_preamble_inst)
-            succ = (test_p.successors + test_p.unconstrained_successors)[0]
+            succ = trace[num_preamble_inst]
+            if succ is None:
+                raise IdentifierException("preamble of %#x errors" % func.startpoint.addr)
 
         min_sp = goal_sp
-        initial_sp = initial_state.se.any_int(initial_state.regs.sp)
+        initial_sp = sps[0]
         frame_size = initial_sp - min_sp - self.project.arch.bytes
-        if num_preamble_inst is None or succ is None:
-            raise IdentifierException("preamble checks failed for %#x" % func.startpoint.addr)
 
         if len(succ.state.se.any_n_int((initial_path.state.regs.sp - succ.state.regs.bp), 2)) == 1:
             bp_based = True
@@ -555,7 +1108,10 @@ class Identifier(object):
             main_state = self._make_regs_symbolic(main_state, [self._bp_reg], self.project)
 
         pushed_regs = []
-        for a in succ.last_actions:
+        preamble_actions = trace_actions[:num_preamble_inst] if succ is not initial_path else []
+        if None in preamble_actions:
+            raise IdentifierException("preamble of %#x errors" % func.startpoint.addr)
+        for a in itertools.chain.from_iterable(preamble_actions):
             if a.type == "mem" and a.action == "write":
                 addr = succ.state.se.any_int(a.addr.ast)
                 if min_sp <= addr <= initial_sp:
@@ -571,22 +1127,22 @@ class Identifier(object):
             end_preamble = func.startpoint.addr
             preamble_addrs = set()
         else:
-            preamble_block = self.project.factory.block(func.startpoint.addr, num_inst=num_preamble_inst)
+            preamble_block = self._blocks.block(func.startpoint.addr, num_inst=num_preamble_inst)
             preamble_addrs = set(preamble_block.instruction_addrs)
             end_preamble = func.startpoint.addr + preamble_block.vex.size
         for block in func.endpoints:
             addr = block.addr
             if addr in preamble_addrs:
                 addr = end_preamble
-            if self.project.factory.block(addr).vex.jumpkind == "Ijk_Ret":
+            if self._blocks.block(addr).vex.jumpkind == "Ijk_Ret":
                 main_state.ip = addr
                 test_p = self.project.factory.path(main_state)
                 test_p.step()
                 for a in (test_p.successors + test_p.unconstrained_successors)[0].last_actions:
                     if a.type == "reg" and a.action == "write":
-                        if self.get_reg_name(self.project.arch, a.offset) == self._sp_reg:
+                        if reg_name(self.project.arch, a.offset) == self._sp_reg:
                             ends.add(a.ins_addr)
-                            all_end_addrs.update(set(self.project.factory.block(a.ins_addr).instruction_addrs))
+                            all_end_addrs.update(set(self._blocks.block(a.ins_addr).instruction_addrs))
 
         bp_sp_diff = None
         if bp_based:
@@ -606,50 +1162,78 @@ class Identifier(object):
         stack_vars = set()
         stack_var_accesses = defaultdict(set)
         buffers = set()
-        possible_stack_vars = []
+
+        # instructions that may access the stack
+        insn_addrs = set()
+        bt_addrs = set()
         for addr in all_addrs - all_end_addrs - preamble_addrs:
-            bl = self.project.factory.block(addr, num_inst=1)
-            if self._is_bt(bl):
+            facts = self._blocks.insn_facts(addr)
+            if facts.is_bt:
+                bt_addrs.add(addr)
                 continue
-            if self._is_jump_or_call(bl):
-                continue
-            if self._no_sp_or_bp(bl):
+            if facts.is_jump_or_call or not facts.uses_sp_or_bp:
                 continue
+            insn_addrs.add(addr)
+
+        # (instruction address, "sp" or "bp", offset, is buffer, action) of each access
+        accesses = []
+        symbolic_addrs = insn_addrs
+        if static_offsets:
+            # most accesses can be resolved from the vex alone, only the rest are run symbolically
+            symbolic_addrs = set()
+            reg_values = dict((r, base_value(main_state, r)) for r in self._reg_list)
+            offsets = StackOffsets(self.project.arch, reg_values, self._reg_list, self._sp_reg, self._bp_reg, bp_based)
+            for addr in insn_addrs:
+                found = offsets.accesses(self._blocks.block(addr, num_inst=1).vex)
+                if found is None:
+                    symbolic_addrs.add(addr)
+                    continue
+                accesses.extend((addr,) + a for a in found)
+
+        possible_stack_vars = []
+        single_addrs = symbolic_addrs
+        if not per_instruction:
+            single_addrs = set()
+            for bl_addr in func.block_addrs:
+                bl_insn_addrs = self._cfg.get_any_node(bl_addr).instruction_addrs
+                wanted = [a for a in bl_insn_addrs if a in symbolic_addrs]
+                if len(wanted) == 0:
+                    continue
+                # run the block up to its last wanted instruction, vex does weird stuff with bit tests so those
+                # blocks are stepped an instruction at a time
+                num_inst = bl_insn_addrs.index(wanted[-1]) + 1
+                actions = None
+                if not any(a in bt_addrs for a in bl_insn_addrs[:num_inst]):
+                    actions = self._block_actions(main_state, bl_insn_addrs[:num_inst])
+                if actions is None:
+                    single_addrs.update(wanted)
+                    continue
+                for addr in wanted:
+                    self._add_stack_var_actions(addr, actions[addr], bp_based, possible_stack_vars)
+
+        for addr in single_addrs:
             main_state.ip = addr
             test_p = self.project.factory.path(main_state)
             test_p.step(num_inst=1)
             succ = (test_p.successors + test_p.unconstrained_successors)[0]
+            self._add_stack_var_actions(addr, succ.last_actions, bp_based, possible_stack_vars)
 
-            written_regs = set()
-            # we can get stack variables via memory actions
-            for a in succ.last_actions:
-                if a.type == "mem":
-                    if "sym_sp" in a.addr.ast.variables or (bp_based and "sym_bp" in a.addr.ast.variables):
-                        possible_stack_vars.append((addr, a.addr.ast, a.action))
-                if a.type == "reg" and a.action == "write":
-                    # stack variables can also be if a stack addr is loaded into a register, eg lea
-                    reg_name = self.get_reg_name(self.project.arch, a.offset)
-                    # ignore bp if bp_based
-                    if reg_name == self._bp_reg and bp_based:
-                        continue
-                    # ignore weird regs
-                    if reg_name not in self._reg_list:
-                        continue
-                    # check if it was a stack var
-                    if "sym_sp" in a.data.ast.variables or (bp_based and "sym_bp" in a.data.ast.variables):
-                        possible_stack_vars.append((addr, a.data.ast, "load"))
-                    written_regs.add(reg_name)
-
+        # solve the offsets in a state without the constraints of any step
+        solver_state = main_state.copy()
         for addr, ast, action in possible_stack_vars:
-            if "sym_sp" in ast.variables:
-                # constrain all to be zero so we detect the base address of buffers
-                simplified = succ.state.se.simplify(ast - sp)
-                if succ.state.se.symbolic(simplified):
-                    self.constrain_all_zero(test_p.state, succ.state, self._reg_list)
-                    is_buffer = True
-                else:
-                    is_buffer = False
-                sp_off = succ.state.se.any_int(simplified)
+            base, base_reg = ("sp", sp) if "sym_sp" in ast.variables else ("bp", bp)
+            # constrain all to be zero so we detect the base address of buffers
+            simplified = solver_state.se.simplify(ast - base_reg)
+            if solver_state.se.symbolic(simplified):
+                self.constrain_all_zero(main_state, solver_state, self._reg_list)
+                is_buffer = True
+            else:
+                is_buffer = False
+            accesses.append((addr, base, solver_state.se.any_int(simplified), is_buffer, action))
+
+        for addr, base, off, is_buffer, action in accesses:
+            if base == "sp":
+                sp_off = off
                 if sp_off > 2 ** (self.project.arch.bits - 1):
                     sp_off = 2 ** self.project.arch.bits - sp_off
 
@@ -658,26 +1242,15 @@ class Identifier(object):
                     bp_off = sp_off - bp_sp_diff
                 else:
                     bp_off = sp_off - (initial_sp-min_sp) + self.project.arch.bytes
-
-                stack_var_accesses[bp_off].add((addr, action))
-                stack_vars.add(bp_off)
-
-                if is_buffer:
-                    buffers.add(bp_off)
             else:
-                simplified = succ.state.se.simplify(ast - bp)
-                if succ.state.se.symbolic(simplified):
-                    self.constrain_all_zero(test_p.state, succ.state, self._reg_list)
-                    is_buffer = True
-                else:
-                    is_buffer = False
-                bp_off = succ.state.se.any_int(simplified)
+                bp_off = off
                 if bp_off > 2 ** (self.project.arch.bits - 1):
                     bp_off = -(2 ** self.project.arch.bits - bp_off)
-                stack_var_accesses[bp_off].add((addr, action))
-                stack_vars.add(bp_off)
-                if is_buffer:
-                    buffers.add(bp_off)
+
+            stack_var_accesses[bp_off].add((addr, action))
+            stack_vars.add(bp_off)
+            if is_buffer:
+                buffers.add(bp_off)
 
         stack_args = list()
         stack_arg_accesses = defaultdict(set)
@@ -723,6 +1296,110 @@ class Identifier(object):
 
         return func_info
 
+    def _add_stack_var_actions(self, addr, actions, bp_based, possible_stack_vars):
+        """
+        Adds the stack addresses the instruction at addr accesses or computes to possible_stack_vars
+        """
+        for a in actions:
+            # we can get stack variables via memory actions
+            if a.type == "mem":
+                if "sym_sp" in a.addr.ast.variables or (bp_based and "sym_bp" in a.addr.ast.variables):
+                    possible_stack_vars.append((addr, a.addr.ast, a.action))
+            if a.type == "reg" and a.action == "write":
+                # stack variables can also be if a stack addr is loaded into a register, eg lea
+                name = reg_name(self.project.arch, a.offset)
+                # ignore bp if bp_based
+                if name == self._bp_reg and bp_based:
+                    continue
+                # ignore weird regs
+                if name not in self._reg_list:
+                    continue
+                # check if it was a stack var
+                if "sym_sp" in a.data.ast.variables or (bp_based and "sym_bp" in a.data.ast.variables):
+                    possible_stack_vars.append((addr, a.data.ast, "load"))
+
+    def _block_actions(self, main_state, insn_addrs):
+        """
+        Runs the instructions of a block in one step. Every instruction starts from the registers of main_state and
+        loads don't return stack addresses stored earlier in the block, so each one sees what it would see stepped on
+        its own.
+        :param insn_addrs:  the addresses of the instructions to run, from the start of the block
+        :return: a dict of instruction address to its actions, or None if the block didn't run to the last one
+        """
+        state = main_state.copy()
+        state.ip = insn_addrs[0]
+        reset_regs = [self._sp_reg, self._bp_reg] + self._reg_list
+        reset_regs += [r for r in ("cc_op", "cc_dep1", "cc_dep2", "cc_ndep", "d") if r in self.project.arch.registers]
+        reg_vals = [(r, main_state.registers.load(r)) for r in reset_regs]
+
+        def reset(s):
+            for r, v in reg_vals:
+                s.registers.store(r, v)
+
+        def hide_stack_addrs(s):
+            expr = s.inspect.mem_read_expr
+            if "sym_sp" in expr.variables or "sym_bp" in expr.variables:
+                s.inspect.mem_read_expr = s.se.BVS("stack_load", expr.size())
+
+        state.inspect.b("instruction", when=simuvex.BP_BEFORE, action=reset)
+        state.inspect.b("mem_read", when=simuvex.BP_AFTER, action=hide_stack_addrs)
+
+        # without optimization no temporaries are shared between instructions
+        test_p = self.project.factory.path(state)
+        test_p.step(num_inst=len(insn_addrs), opt_level=0)
+        succs = test_p.successors + test_p.unconstrained_successors
+        if len(succs) == 0:
+            return None
+
+        # taken exits leave the block early, the successor that ran furthest has the actions of all instructions
+        succ = max(succs, key=lambda p: len(p.last_actions))
+        actions = defaultdict(list)
+        for a in succ.last_actions:
+            actions[a.ins_addr].append(a)
+        if insn_addrs[-1] not in actions:
+            return None
+        return actions
+
+    def _preamble_trace(self, initial_path, num_inst, per_prefix=False):
+        """
+        Steps num_inst instructions from the path one at a time
+        :param per_prefix:  step each prefix of the instructions from scratch instead, which is slower
+        :return: the paths after each number of instructions, starting with initial_path, and the actions of each
+                 instruction. Once an instruction errors the paths and actions are None.
+        """
+        if per_prefix:
+            return self._preamble_trace_per_prefix(initial_path, num_inst)
+
+        trace = [initial_path]
+        trace_actions = []
+        for _ in xrange(num_inst):
+            p = trace[-1]
+            succ = None
+            if p is not None:
+                p.step(num_inst=1)
+                succ = (p.successors + p.unconstrained_successors)[0]
+                if succ.errored:
+                    succ = None
+            trace.append(succ)
+            trace_actions.append(list(succ.last_actions) if succ is not None else None)
+        return trace, trace_actions
+
+    def _preamble_trace_per_prefix(self, initial_path, num_inst):
+        insn_addrs = self._blocks.block(initial_path.addr).instruction_addrs
+        trace = [initial_path]
+        trace_actions = []
+        for i in xrange(1, num_inst + 1):
+            p = self.project.factory.path(initial_path.state)
+            p.step(num_inst=i)
+            succ = (p.successors + p.unconstrained_successors)[0]
+            if succ.errored:
+                trace.append(None)
+                trace_actions.append(None)
+                continue
+            trace.append(succ)
+            trace_actions.append([a for a in succ.last_actions if a.ins_addr == insn_addrs[i-1]])
+        return trace, trace_actions
+
     def _sets_ebp_from_esp(self, state, addr):
         state = state.copy()
         state.regs.ip = addr
@@ -740,54 +1417,6 @@ class Identifier(object):
             return True
         return False
 
-    @staticmethod
-    def _is_bt(bl):
-        # vex does really weird stuff with bit test instructions
-        if bl.bytes.startswith("\x0f\xa3"):
-            return True
-        return False
-
-    @staticmethod
-    def _is_jump_or_call(bl):
-        if bl.vex.jumpkind != "Ijk_Boring":
-            return True
-        if len(bl.vex.constant_jump_targets) != 1:
-            return True
-        if next(iter(bl.vex.constant_jump_targets)) != bl.addr + bl.size:
-            return True
-
-        return False
-
-    @staticmethod
-    def get_reg_name(arch, reg_offset):
-        """
-        :param reg_offset: Tries to find the name of a register given the offset in the registers.
-        :return: The register name
-        """
-        if reg_offset is None:
-            return None
-
-        original_offset = reg_offset
-        while reg_offset >= 0 and reg_offset >= original_offset - (arch.bits/8):
-            if reg_offset in arch.register_names:
-                return arch.register_names[reg_offset]
-            else:
-                reg_offset -= 1
-        return None
-
-    def _no_sp_or_bp(self, bl):
-        for s in bl.vex.statements:
-            for e in [s] + s.expressions:
-                if e.tag == "Iex_Get":
-                    reg = self.get_reg_name(self.project.arch, e.offset)
-                    if reg == "ebp" or reg == "esp":
-                        return False
-                elif e.tag == "Ist_Put":
-                    reg = self.get_reg_name(self.project.arch, e.offset)
-                    if reg == "ebp" or reg == "esp":
-                        return False
-        return True
-
     @staticmethod
     def _filter_stack_args(func_info):
         if -4 in func_info.stack_args:
@@ -4,12 +4,14 @@ import angr
 import simuvex
 import simuvex.s_options as so
 from simuvex.s_type import SimTypeFunction, SimTypeInt
-from .custom_callable import Callable
-from angr.errors import AngrCallableMultistateError, AngrCallableError
-import claripy
-from tracer.simprocedures import FixedOutTransmit, FixedInReceive
-
-import random
+from .cache import DiskCache, LRUCache, hash_file
+from .errors import BackendFallback
+from .backend import AngrBackend, ProbeResult, concrete_int
+from .unicorn_backend import UnicornBackend
+from . import syscalls
+
+import time
+import hashlib
 import logging
 l = logging.getLogger("identifier.runner")
 
@@ -19,27 +21,145 @@ with open(flag_loc, "rb") as f:
     FLAG_DATA = f.read()
 assert len(FLAG_DATA) == 0x1000
 
+# max number of steps to take from the entry point looking for the first receive
+RECV_STATE_MAX_STEPS = 50
+# bump this when the way the receive state is built changes, it invalidates old snapshots
+SNAPSHOT_VERSION = 1
+# minimum number of bytes of each string argument a probe records
+PROBE_READ_LEN = 0x100
+# sizes of the in-memory result caches, result states are large so fewer of them are kept
+PROBE_CACHE_ENTRIES = 4096
+TEST_CACHE_ENTRIES = 4096
+OUT_STATE_CACHE_ENTRIES = 256
+GUARD_CACHE_ENTRIES = 256
+
+# marks a cache miss, None is a valid cached result
+_MISSING = object()
+
+
+class TestOutcome(object):
+    def __init__(self, test_data, passed, elapsed):
+        """
+        :param test_data:   the TestData that was run
+        :param passed:      whether the function behaved as the test expected
+        :param elapsed:     wall time of the test in seconds, including the state setup
+        """
+        self.test_data = test_data
+        self.passed = passed
+        self.elapsed = elapsed
+
+
 class Runner(object):
-    def __init__(self, project, cfg):
+    def __init__(self, project, cfg, snapshot_dir=None, native=False, backends=None, early_abort=False):
+        """
+        :param project:         the angr project
+        :param cfg:             the cfg of the project
+        :param snapshot_dir:    if set, the receive-ready base state is pickled into this directory
+                                and reloaded by later runners on the same binary
+        :param native:          run concrete tests in unicorn directly, falling back to angr when they need it
+        :param backends:        the Backend classes to run calls with, tried in order,
+                                by default the unicorn backend if native is set and then angr
+        :param early_abort:     stop a test as soon as it transmits stdout that can't match
+        """
         self.project = project
         self.cfg = cfg
+        # FIXME fdwait should do something concrete...
+        syscalls.register()
         self.base_state = None
+        # prepared states keyed by concrete_rand, tests start from a copy of these
+        self._templates = dict()
+        # calling conventions keyed by the number of arguments
+        self._ccs = dict()
+        # results of deterministic runs keyed by function address and test fingerprint
+        self._probes = LRUCache(PROBE_CACHE_ENTRIES)
+        self._test_results = LRUCache(TEST_CACHE_ENTRIES)
+        self._out_states = LRUCache(OUT_STATE_CACHE_ENTRIES)
+        self._guards = LRUCache(GUARD_CACHE_ENTRIES)
+        # (format spec char, string spec char) of functions keyed by address, found by the printf family candidates
+        self.format_specs = dict()
+        # the states and pointers of malloc called repeatedly without frees, keyed by its address, see free.try_match
+        self.malloc_chains = dict()
+        # number of calls the runner has emulated
+        self.emulations = 0
+        # (function address, Func class name) to (argument orders tried, orders there were) for Funcs that search
+        # the order of their arguments
+        self.arg_orders_tried = dict()
+        # set to False to build every test state from scratch, eg. for benchmarking
+        self.use_state_template = True
+        self.early_abort = early_abort
+        self._snapshots = DiskCache(snapshot_dir) if snapshot_dir is not None else None
+
+        # result states and call states are only available from angr
+        self._angr = AngrBackend(self)
+        if backends is None:
+            backends = [UnicornBackend] if native else []
+            backends.append(AngrBackend)
+        self.backends = []
+        for backend_cls in backends:
+            if backend_cls is AngrBackend:
+                self.backends.append(self._angr)
+                continue
+            try:
+                self.backends.append(backend_cls(self))
+            except BackendFallback as e:
+                l.warning("not using %s: %s", backend_cls.__name__, e.message)
+
+    @staticmethod
+    def _recv_state_options():
+        options = set()
+        options.add(so.CGC_ZERO_FILL_UNCONSTRAINED_MEMORY)
+        options.add(so.CGC_NO_SYMBOLIC_RECEIVE_LENGTH)
+        options.add(so.TRACK_MEMORY_MAPPING)
+        options.add(so.AVOID_MULTIVALUED_READS)
+        options.add(so.AVOID_MULTIVALUED_WRITES)
+
+        # try to enable unicorn, continue if it doesn't exist
+        options.add(so.UNICORN)
+
+        remove_options = so.simplification | set(so.LAZY_SOLVES) | simuvex.o.resilience_options | set(so.SUPPORT_FLOATING_POINT)
+        return options, remove_options
+
+    def _snapshot_key(self):
+        if self.project.filename is None or not os.path.isfile(self.project.filename):
+            return None
+        add_options, remove_options = self._recv_state_options()
+        return DiskCache.make_key(SNAPSHOT_VERSION,
+                                  hash_file(self.project.filename),
+                                  hashlib.sha256(FLAG_DATA).hexdigest(),
+                                  ",".join(sorted(add_options)),
+                                  ",".join(sorted(remove_options)),
+                                  RECV_STATE_MAX_STEPS)
+
+    def _get_base_state(self):
+        """
+        :return: the receive-ready base state, loaded from the snapshot directory when possible
+        """
+        if self.base_state is not None:
+            return self.base_state
+
+        key = None
+        if self._snapshots is not None:
+            key = self._snapshot_key()
+        if key is not None:
+            self.base_state = self._snapshots.get(key)
+            if self.base_state is not None:
+                l.debug("loaded recv state snapshot %s", key)
+                return self.base_state
+
+        self.base_state, at_recv = self._get_recv_state()
+        # a state that didn't reach receive may only be missing it this time, don't make later runs reuse it
+        if key is not None and at_recv:
+            self._snapshots.put(key, self.base_state)
+        return self.base_state
 
     def _get_recv_state(self):
+        """
+        :return: the state at the first receive and True, or the best state found and False if it wasn't reached
+        """
         try:
-            options = set()
-            options.add(so.CGC_ZERO_FILL_UNCONSTRAINED_MEMORY)
-            options.add(so.CGC_NO_SYMBOLIC_RECEIVE_LENGTH)
-            options.add(so.TRACK_MEMORY_MAPPING)
-            options.add(so.AVOID_MULTIVALUED_READS)
-            options.add(so.AVOID_MULTIVALUED_WRITES)
-
-            # try to enable unicorn, continue if it doesn't exist
-            options.add(so.UNICORN)
+            add_options, remove_options = self._recv_state_options()
             l.info("unicorn tracing enabled")
 
-            remove_options = so.simplification | set(so.LAZY_SOLVES) | simuvex.o.resilience_options | set(so.SUPPORT_FLOATING_POINT)
-            add_options = options
             entry_state = self.project.factory.entry_state(
                     add_options=add_options,
                     remove_options=remove_options)
@@ -50,22 +170,16 @@ class Runner(object):
             # map the place where I put arguments
             entry_state.memory.mem.map_region(0x2000, 0x10000, 7)
 
-            entry_state.unicorn._register_check_count = 100
-            entry_state.unicorn._runs_since_symbolic_data = 100
-            entry_state.unicorn._runs_since_unicorn = 100
-
-            # cooldowns
-            entry_state.unicorn.cooldown_symbolic_registers = 0
-            entry_state.unicorn.cooldown_symbolic_memory = 0
-            entry_state.unicorn.cooldown_nonunicorn_blocks = 1
-            entry_state.unicorn.max_steps = 10000
+            self._configure_unicorn(entry_state)
 
             pg = self.project.factory.path_group(entry_state)
             num_steps = 0
+            at_recv = False
             while len(pg.active) > 0:
                 syscall = self.project._simos.syscall_table.get_by_addr(pg.one_active.addr)
                 if syscall is not None and syscall.name == 'receive':
                     # execute until receive
+                    at_recv = True
                     break
 
                 if len(pg.active) > 1:
@@ -73,281 +187,365 @@ class Runner(object):
                     pg = self.project.factory.path_group(pp)
                 pg.step()
                 num_steps += 1
-                if num_steps > 50:
+                if num_steps > RECV_STATE_MAX_STEPS:
                     break
             if len(pg.active) > 0:
                 out_state = pg.one_active.state
             elif len(pg.deadended) > 0:
                 out_state = pg.deadended[0].state
             else:
-                return self.project.factory.entry_state()
+                return self.project.factory.entry_state(), False
             out_state.scratch.clear()
             out_state.scratch.jumpkind = "Ijk_Boring"
-            return out_state
+            return out_state, at_recv
         except simuvex.SimError as e:
             l.warning("SimError in get recv state %s", e.message)
-            return self.project.factory.entry_state()
+            return self.project.factory.entry_state(), False
         except angr.AngrError as e:
             l.warning("AngrError in get recv state %s", e.message)
-            return self.project.factory.entry_state()
+            return self.project.factory.entry_state(), False
 
-    def setup_state(self, function, test_data, initial_state=None, concrete_rand=False):
-        # FIXME fdwait should do something concrete...
-        # FixedInReceive and FixedOutReceive always are applied
-        simuvex.SimProcedures['cgc']['transmit'] = FixedOutTransmit
-        simuvex.SimProcedures['cgc']['receive'] = FixedInReceive
+    @staticmethod
+    def _configure_unicorn(state):
+        state.unicorn._register_check_count = 100
+        state.unicorn._runs_since_symbolic_data = 100
+        state.unicorn._runs_since_unicorn = 100
 
-        fs = {'/dev/stdin': simuvex.storage.file.SimFile(
-            "/dev/stdin", "r",
-            size=len(test_data.preloaded_stdin))}
+        # cooldowns
+        state.unicorn.cooldown_symbolic_registers = 0
+        state.unicorn.cooldown_symbolic_memory = 0
+        state.unicorn.cooldown_nonunicorn_blocks = 1
+        state.unicorn.max_steps = 10000
+
+    def _prepare_state(self, state, concrete_rand):
+        """
+        Applies the test-independent setup to a state: page permissions, concrete registers,
+        unicorn settings and the syscall options
+        """
+        state.options.add(so.STRICT_PAGE_ACCESS)
 
-        if initial_state is None:
-            temp_state = self.project.factory.entry_state(fs=fs)
-            if self.base_state is None:
-                self.base_state = self._get_recv_state()
-            entry_state = self.base_state.copy()
-            entry_state.register_plugin("posix",temp_state.posix)
+        # make sure unicorn will run
+        for k in dir(state.regs):
+            r = getattr(state.regs, k)
+            if r.symbolic:
+                setattr(state.regs, k, 0)
+
+        self._configure_unicorn(state)
+
+        # read by the syscall procedures, states passed along as initial_state may have been prepared before
+        state.options.add(syscalls.LIMIT_IO)
+        if concrete_rand:
+            state.options.add(syscalls.CONCRETE_RAND)
+        else:
+            state.options.discard(syscalls.CONCRETE_RAND)
+
+    def _get_template(self, concrete_rand):
+        """
+        :return: a prepared state that only needs the per-test stdin and ip applied to a copy of it
+        """
+        if concrete_rand not in self._templates:
+            temp_state = self.project.factory.entry_state()
+            template = self._get_base_state().copy()
+            template.register_plugin("posix", temp_state.posix)
             temp_state.release_plugin("posix")
+            self._prepare_state(template, concrete_rand)
+            self._templates[concrete_rand] = template
+        return self._templates[concrete_rand]
+
+    @staticmethod
+    def _set_stdin(state, stdin):
+        stdin_file = simuvex.storage.file.SimFile("/dev/stdin", "r", size=len(stdin))
+        stdin_file.set_state(state)
+        state.posix.files[0] = stdin_file
+        state.posix.fs['/dev/stdin'] = stdin_file
+
+    def setup_state(self, function, test_data, initial_state=None, concrete_rand=False):
+        if initial_state is None and self.use_state_template:
+            entry_state = self._get_template(concrete_rand).copy()
+            self._set_stdin(entry_state, test_data.preloaded_stdin)
             entry_state.ip = function.startpoint.addr
+            # the template was never stepped, but reset the counters in case copying did not keep them
+            self._configure_unicorn(entry_state)
         else:
-            entry_state = initial_state.copy()
+            if initial_state is None:
+                fs = {'/dev/stdin': simuvex.storage.file.SimFile(
+                    "/dev/stdin", "r",
+                    size=len(test_data.preloaded_stdin))}
+                temp_state = self.project.factory.entry_state(fs=fs)
+                entry_state = self._get_base_state().copy()
+                entry_state.register_plugin("posix", temp_state.posix)
+                temp_state.release_plugin("posix")
+                entry_state.ip = function.startpoint.addr
+            else:
+                entry_state = initial_state.copy()
+            self._prepare_state(entry_state, concrete_rand)
 
         # set stdin
         entry_state.cgc.input_size = len(test_data.preloaded_stdin)
         if len(test_data.preloaded_stdin) > 0:
             entry_state.posix.files[0].content.store(0, test_data.preloaded_stdin)
 
-        entry_state.options.add(so.STRICT_PAGE_ACCESS)
-
-        # make sure unicorn will run
-        for k in dir(entry_state.regs):
-            r = getattr(entry_state.regs, k)
-            if r.symbolic:
-                setattr(entry_state.regs, k, 0)
-
-        entry_state.unicorn._register_check_count = 100
-        entry_state.unicorn._runs_since_symbolic_data = 100
-        entry_state.unicorn._runs_since_unicorn = 100
-
-        # cooldowns
-        entry_state.unicorn.cooldown_symbolic_registers = 0
-        entry_state.unicorn.cooldown_symbolic_memory = 0
-        entry_state.unicorn.cooldown_nonunicorn_blocks = 1
-        entry_state.unicorn.max_steps = 10000
-
-        # syscall hook
-        entry_state.inspect.b(
-            'syscall',
-            simuvex.BP_BEFORE,
-            action=self.syscall_hook
-        )
-
-        if concrete_rand:
-            entry_state.inspect.b(
-                'syscall',
-                simuvex.BP_AFTER,
-                action=self.syscall_hook_concrete_rand
-            )
-
         # solver timeout
         entry_state.se._solver.timeout = 500
 
         return entry_state
 
-    @staticmethod
-    def syscall_hook(state):
-        # FIXME maybe we need to fix transmit/receive to handle huge vals properly
-        # kill path that try to read/write large amounts
-        syscall_name = state.inspect.syscall_name
-        if syscall_name == "transmit":
-            count = state.se.any_int(state.regs.edx)
-            if count > 0x10000:
-                state.regs.edx = 0
-                state.add_constraints(claripy.BoolV(False))
-        if syscall_name == "receive":
-            count = state.se.any_int(state.regs.edx)
-            if count > 0x10000:
-                state.regs.edx = 0
-                state.add_constraints(claripy.BoolV(False))
-        if syscall_name == "random":
-            count = state.se.any_int(state.regs.ecx)
-            if count > 0x1000:
-                state.regs.ecx = 0
-                state.add_constraints(claripy.BoolV(False))
-
-    @staticmethod
-    def syscall_hook_concrete_rand(state):
-        # FIXME maybe we need to fix transmit/receive to handle huge vals properly
-        # kill path that try to read/write large amounts
-        syscall_name = state.inspect.syscall_name
-        if syscall_name == "random":
-            count = state.se.any_int(state.regs.ecx)
-            if count > 100:
-                return
-            buf = state.se.any_int(state.regs.ebx)
-            for i in range(count):
-                a = random.randint(0, 255)
-                state.memory.store(buf+i, state.se.BVV(a, 8))
-
     def get_base_call_state(self, function, test_data, initial_state=None, concrete_rand=False):
-        curr_buf_loc = 0x2000
-        mapped_input = []
-        s = self.setup_state(function, test_data, initial_state, concrete_rand=concrete_rand)
-
-        for i in test_data.input_args:
-            if isinstance(i, str) or isinstance(i, claripy.ast.BV):
-                s.memory.store(curr_buf_loc, i)
-                mapped_input.append(curr_buf_loc)
-                curr_buf_loc += max(len(i), 0x1000)
-            else:
-                if not isinstance(i, (int, long)):
-                    raise Exception("Expected int/long got %s", type(i))
-                mapped_input.append(i)
-
-        inttype = SimTypeInt(self.project.arch.bits, False)
-        func_ty = SimTypeFunction([inttype] * len(mapped_input), inttype)
-        cc = self.project.factory.cc(func_ty=func_ty)
-        call = Callable(self.project, function.startpoint.addr, concrete_only=True,
-                        cc=cc, base_state=s, max_steps=test_data.max_steps)
-        return call.get_base_state(*mapped_input)
+        return self._angr.call_state(function, test_data, initial_state, concrete_rand=concrete_rand)
+
+    def _get_cc(self, num_args):
+        if num_args not in self._ccs:
+            inttype = SimTypeInt(self.project.arch.bits, False)
+            func_ty = SimTypeFunction([inttype] * num_args, inttype)
+            self._ccs[num_args] = self.project.factory.cc(func_ty=func_ty)
+        return self._ccs[num_args]
+
+    def _run(self, function, test_data, reads, concrete_rand=False, custom_offs=None, early_abort=False):
+        """
+        Runs the call in the first backend that can tell what it does
+        :return: a ProbeResult, or None if the call failed
+        """
+        for backend in self.backends:
+            try:
+                result = backend.run(function, test_data, reads, concrete_rand=concrete_rand, custom_offs=custom_offs,
+                                     early_abort=early_abort)
+            except BackendFallback as e:
+                l.debug("%s can't run %#x: %s", backend.__class__.__name__, function.addr, e.message)
+                backend.fallbacks += 1
+                continue
+            self.emulations += 1
+            return result
+
+        l.warning("no backend could run %#x", function.addr)
+        return None
 
-    def test(self, function, test_data, concrete_rand=False, custom_offs=None):
-        curr_buf_loc = 0x2000
-        mapped_input = []
-        s = self.setup_state(function, test_data, concrete_rand=concrete_rand)
-
-        if custom_offs is None:
-            for i in test_data.input_args:
-                if isinstance(i, str):
-                    s.memory.store(curr_buf_loc, i + "\x00")
-                    mapped_input.append(curr_buf_loc)
-                    curr_buf_loc += max(len(i), 0x1000)
-                else:
-                    if not isinstance(i, (int, long)):
-                        raise Exception("Expected int/long got %s", type(i))
-                    mapped_input.append(i)
-        else:
-            for i, off in zip(test_data.input_args, custom_offs):
-                if isinstance(i, str):
-                    s.memory.store(curr_buf_loc, i + "\x00")
-                    mapped_input.append(curr_buf_loc+off)
-                    curr_buf_loc += max(len(i), 0x1000)
-                else:
-                    if not isinstance(i, (int, long)):
-                        raise Exception("Expected int/long got %s", type(i))
-                    mapped_input.append(i)
-
-        inttype = SimTypeInt(self.project.arch.bits, False)
-        func_ty = SimTypeFunction([inttype] * len(mapped_input), inttype)
-        cc = self.project.factory.cc(func_ty=func_ty)
-        try:
-            call = Callable(self.project, function.startpoint.addr, concrete_only=True,
-                            cc=cc, base_state=s, max_steps=test_data.max_steps)
-            result = call(*mapped_input)
-            result_state = call.result_state
-        except AngrCallableMultistateError as e:
-            l.info("multistate error: %s", e.message)
-            return False
-        except AngrCallableError as e:
-            l.info("other callable error: %s", e.message)
-            return False
-
-        # check matches
-        outputs = []
-        for i, out in enumerate(test_data.expected_output_args):
-            if isinstance(out, str):
-                if len(out) == 0:
-                    raise Exception("len 0 out")
-                outputs.append(result_state.memory.load(mapped_input[i], len(out)))
-            else:
-                outputs.append(None)
-
-        tmp_outputs = outputs
-        outputs = []
-        for out in tmp_outputs:
-            if out is None:
-                outputs.append(None)
-            elif result_state.se.symbolic(out):
-                l.info("symbolic memory output")
-                return False
-            else:
-                outputs.append(result_state.se.any_str(out))
-
-        if outputs != test_data.expected_output_args:
-            # print map(lambda x: x.encode('hex'), [a for a in outputs if a is not None]), map(lambda x: x.encode('hex'), [a for a in test_data.expected_output_args if a is not None])
-            l.info("mismatch output")
-            return False
-
-        if result_state.se.symbolic(result):
-            l.info("result value sybolic")
-            return False
+    @staticmethod
+    def _test_reads(test_data):
+        # the bytes of each argument a test compares
+        return dict((i, len(out)) for i, out in enumerate(test_data.expected_output_args) if isinstance(out, str))
 
-        if test_data.expected_return_val is not None and test_data.expected_return_val < 0:
-            test_data.expected_return_val &= (2**self.project.arch.bits - 1)
-        if test_data.expected_return_val is not None and \
-                result_state.se.any_int(result) != test_data.expected_return_val:
-            l.info("return val mismatch got %#x, expected %#x", result_state.se.any_int(result), test_data.expected_return_val)
+    @staticmethod
+    def _probe_reads(test_data):
+        # probes record enough of each string argument for the tests of every candidate
+        return dict((i, max(len(arg) + 1, PROBE_READ_LEN)) for i, arg in enumerate(test_data.input_args)
+                    if isinstance(arg, str))
+
+    def _run_test(self, function, test_data, concrete_rand=False, custom_offs=None, early_abort=None):
+        """
+        :param early_abort: whether to stop the test once it can't match, by default the runner's setting
+        :return: True if the test passed
+        """
+        if early_abort is None:
+            early_abort = self.early_abort
+        # probes are shared between candidates, so only tests stop early
+        result = self._run(function, test_data, self._test_reads(test_data), concrete_rand, custom_offs,
+                           early_abort=early_abort)
+        if result is None:
             return False
+        # outputs that were symbolic fail the test
+        return result.matches(test_data, self.project.arch.bits) is True
+
+    def backend_stats(self):
+        """
+        :return: a dict of backend name to (calls run, calls handed to the next backend)
+        """
+        return dict((b.__class__.__name__, (b.runs, b.fallbacks)) for b in self.backends)
+
+    def abort_stats(self):
+        """
+        :return: (number of tests stopped early, number of steps they had left)
+        """
+        return sum(b.aborts for b in self.backends), sum(b.steps_saved for b in self.backends)
+
+    def cache_stats(self):
+        """
+        :return: a dict of cache name to (hits, misses) for the result caches
+        """
+        return {
+            "probe": (self._probes.hits, self._probes.misses),
+            "test": (self._test_results.hits, self._test_results.misses),
+            "out_state": (self._out_states.hits, self._out_states.misses),
+            "guard": (self._guards.hits, self._guards.misses),
+        }
 
-        if result_state.se.symbolic(result_state.posix.files[1].pos):
-            l.info("symbolic stdout pos")
-            return False
+    @staticmethod
+    def _fingerprint(function, test_data, concrete_rand, custom_offs=None, with_expected=False):
+        """
+        :return: a key identifying the run, or None if the run can't be cached because it isn't deterministic
+        """
+        if concrete_rand:
+            return None
+        if not all(isinstance(i, (str, int, long)) for i in test_data.input_args):
+            return None
 
-        if result_state.se.any_int(result_state.posix.files[1].pos) == 0:
-            stdout = ""
+        key = (function.addr, tuple(test_data.input_args), tuple(custom_offs) if custom_offs is not None else None,
+               test_data.preloaded_stdin, test_data.max_steps)
+        if with_expected:
+            key += (tuple(test_data.expected_output_args), test_data.expected_return_val, test_data.expected_stdout)
+        return key
+
+    def _known_result(self, function, test_data, concrete_rand=False, custom_offs=None):
+        """
+        :return: the key of the test's result, and the result from an earlier test or a probe of the same inputs,
+                 or _MISSING if neither can tell
+        """
+        key = self._fingerprint(function, test_data, concrete_rand, custom_offs, with_expected=True)
+        if key is None:
+            return key, _MISSING
+        passed = self._test_results.get(key, _MISSING)
+        if passed is not _MISSING or custom_offs is not None:
+            return key, passed
+
+        # a candidate's first pretest is often one of the necessary tests the filter already probed
+        probe_key = self._fingerprint(function, test_data, False)
+        if probe_key not in self._probes:
+            return key, _MISSING
+        result = self._probes.get(probe_key)
+        if result is None:
+            passed = False
         else:
-            stdout = result_state.posix.files[1].content.load(0, result_state.posix.files[1].pos)
-            if stdout.symbolic:
-                l.info("symbolic stdout")
-                return False
-            stdout = result_state.se.any_str(stdout)
-
-        if stdout != test_data.expected_stdout:
-            l.info("mismatch stdout")
+            passed = result.matches(test_data, self.project.arch.bits)
+        if passed is None:
+            return key, _MISSING
+        self._test_results.put(key, passed)
+        return key, passed
+
+    def test(self, function, test_data, concrete_rand=False, custom_offs=None):
+        key, passed = self._known_result(function, test_data, concrete_rand, custom_offs)
+        if passed is not _MISSING:
+            return passed
+
+        passed = self._run_test(function, test_data, concrete_rand, custom_offs)
+        if key is not None:
+            self._test_results.put(key, passed)
+        return passed
+
+    def test_many(self, function, tests, concrete_rand=False):
+        """
+        Runs the tests one after another, stopping at the first one that fails.
+        :param function:        the cfg function to test
+        :param tests:           an iterable of TestData
+        :return: a list of TestOutcome, one per test that was run
+        """
+        outcomes = []
+        for test_data in tests:
+            start = time.time()
+            key, passed = self._known_result(function, test_data, concrete_rand)
+            if passed is not _MISSING:
+                outcomes.append(TestOutcome(test_data, passed, time.time() - start))
+                if not passed:
+                    break
+                continue
+
+            passed = self._run_test(function, test_data, concrete_rand)
+            if key is not None:
+                self._test_results.put(key, passed)
+            outcomes.append(TestOutcome(test_data, passed, time.time() - start))
+            if not passed:
+                break
+        return outcomes
+
+    def first_passing(self, function, tests):
+        """
+        Runs the tests one after another, stopping at the first one that passes. Meant for searching through guesses
+        of which most fail, each test stops early if the runner's early_abort is set.
+        :param function:        the cfg function to test
+        :param tests:           an iterable of TestData
+        :return: the index of the test that passed, or None if none did
+        """
+        for i, test_data in enumerate(tests):
+            key, passed = self._known_result(function, test_data)
+            if passed is _MISSING:
+                passed = self._run_test(function, test_data)
+                if key is not None:
+                    self._test_results.put(key, passed)
+            if passed:
+                return i
+        return None
+
+    def guard_constants(self, function, test_data, steps):
+        """
+        Steps the call symbolically and collects the concrete values the guards of the paths compare against.
+        The result is shared by every run of the function with the same symbolic arguments, so it assumes the guards
+        only depend on those.
+        :param test_data:   the test to run, some of its inputs are symbolic
+        :param steps:       the number of steps to explore
+        :return: a frozenset of the constants
+        """
+        symbolic = tuple(i for i, arg in enumerate(test_data.input_args) if not isinstance(arg, (str, int, long)))
+        key = (function.addr, symbolic, steps)
+        consts = self._guards.get(key)
+        if consts is not None:
+            return consts
+
+        s = self.get_base_call_state(function, test_data)
+        pg = self.project.factory.path_group(s)
+        pg.step(steps)
+        consts = set()
+        for p in pg.active:
+            for g in p.guards:
+                if g.op == "__ne__" or g.op == "__eq__":
+                    for a in g.args:
+                        if not a.symbolic:
+                            consts.add(concrete_int(s, a))
+        consts = frozenset(consts)
+        self._guards.put(key, consts)
+        return consts
+
+    def probe(self, function, test_data):
+        """
+        Runs the function on the inputs of the test, the result is kept so that every candidate probing the function
+        with the same inputs shares one run. Only the inputs, max_steps and stdin of the test are used.
+        :return: a ProbeResult, or None if the call failed
+        """
+        key = self._fingerprint(function, test_data, False)
+        if key is None:
+            return self._run_probe(function, test_data)
+
+        result = self._probes.get(key, _MISSING)
+        if result is _MISSING:
+            result = self._run_probe(function, test_data)
+            self._probes.put(key, result)
+        return result
+
+    def probe_test(self, function, test_data):
+        """
+        Same as test, but answered from the probe of the test inputs when it recorded enough
+        """
+        result = self.probe(function, test_data)
+        if result is None:
             return False
+        passed = result.matches(test_data, self.project.arch.bits)
+        if passed is None:
+            return self.test(function, test_data)
+        return passed
 
-        return True
+    def _run_probe(self, function, test_data):
+        return self._run(function, test_data, self._probe_reads(test_data))
 
     def get_out_state(self, function, test_data, initial_state=None, concrete_rand=False, custom_offs=None):
-        curr_buf_loc = 0x2000
-        mapped_input = []
-        s = self.setup_state(function, test_data, initial_state, concrete_rand=concrete_rand)
-
-        if custom_offs is None:
-            for i in test_data.input_args:
-                if isinstance(i, str):
-                    s.memory.store(curr_buf_loc, i + "\x00")
-                    mapped_input.append(curr_buf_loc)
-                    curr_buf_loc += max(len(i), 0x1000)
-                else:
-                    if not isinstance(i, (int, long)):
-                        raise Exception("Expected int/long got %s", type(i))
-                    mapped_input.append(i)
-
-        else:
-            for i, off in zip(test_data.input_args, custom_offs):
-                if isinstance(i, str):
-                    s.memory.store(curr_buf_loc, i + "\x00")
-                    mapped_input.append(curr_buf_loc+off)
-                    curr_buf_loc += max(len(i), 0x1000)
-                else:
-                    if not isinstance(i, (int, long)):
-                        raise Exception("Expected int/long got %s", type(i))
-                    mapped_input.append(i)
-
-        inttype = SimTypeInt(self.project.arch.bits, False)
-        func_ty = SimTypeFunction([inttype] * len(mapped_input), inttype)
-        cc = self.project.factory.cc(func_ty=func_ty)
-        try:
-            call = Callable(self.project, function.startpoint.addr, concrete_only=True,
-                            cc=cc, base_state=s, max_steps=test_data.max_steps)
-            _ = call(*mapped_input)
-            result_state = call.result_state
-        except AngrCallableMultistateError as e:
-            l.info("multistate error: %s", e.message)
-            return None
-        except AngrCallableError as e:
-            l.info("other callable error: %s", e.message)
-            return None
+        # runs continuing from a given state depend on that state, so they are not cached
+        key = None
+        if initial_state is None:
+            key = self._fingerprint(function, test_data, concrete_rand, custom_offs)
+        if key is not None:
+            result_state = self._out_states.get(key, _MISSING)
+            if result_state is None:
+                return None
+            if result_state is not _MISSING:
+                # callers modify the states they get, hand out copies
+                return result_state.copy()
+
+        result_state = self._get_out_state(function, test_data, initial_state, concrete_rand, custom_offs)
+        if key is not None:
+            self._out_states.put(key, result_state)
+            if result_state is not None:
+                return result_state.copy()
+        return result_state
 
+    def _get_out_state(self, function, test_data, initial_state, concrete_rand, custom_offs):
+        # the result state only exists in angr
+        self.emulations += 1
+        _, result_state, _ = self._angr.call(function, test_data, initial_state, concrete_rand=concrete_rand,
+                                             custom_offs=custom_offs)
         return result_state
@@ -0,0 +1,180 @@
+import re
+
+import logging
+l = logging.getLogger("identifier.stack_offsets")
+
+# a value the analysis can't follow that came from the stack pointers, the symbolic engine has to handle it
+TAINTED = "tainted"
+
+# statements that can't touch the stack or that the analysis follows
+_ignored_stmts = {"Ist_IMark", "Ist_NoOp", "Ist_AbiHint", "Ist_MBE"}
+
+
+def _stacky(v):
+    return v == TAINTED or (v is not None and v[0] is not None)
+
+
+def reg_name(arch, reg_offset):
+    """
+    :param arch:        the architecture
+    :param reg_offset:  an offset in the registers
+    :return: the name of the register at the offset, sub registers give the register they are in
+    """
+    if reg_offset is None:
+        return None
+
+    original_offset = reg_offset
+    while reg_offset >= 0 and reg_offset >= original_offset - (arch.bits/8):
+        if reg_offset in arch.register_names:
+            return arch.register_names[reg_offset]
+        else:
+            reg_offset -= 1
+    return None
+
+
+def _type_bytes(ty):
+    # eg. Ity_I32
+    return int(re.search(r"\d+", ty).group(0)) / 8
+
+
+def base_value(state, reg):
+    """
+    :return: the abstract value of a register in the state, TAINTED if the analysis can't follow it
+    """
+    v = state.registers.load(reg)
+    if not v.symbolic:
+        return None, state.se.any_int(v), False
+    if v.op == "BVS":
+        # a register the stack analysis constrains to zero to find the base of buffers
+        return None, 0, True
+    # some other symbolic value, it may or may not be on the stack so the solver decides
+    return TAINTED
+
+
+class StackOffsets(object):
+    """
+    Finds the stack accesses of an instruction from its VEX without the solver. Values are followed as
+    (base, offset, regs) where base is "sp", "bp" or None, offset is a constant and regs is whether symbolic registers
+    were added in, as with [ebp+ecx-0x20].
+    """
+
+    def __init__(self, arch, reg_values, reg_list, sp_reg, bp_reg, bp_based):
+        """
+        :param arch:        the architecture
+        :param reg_values:  the abstract value of each register at the start of an instruction
+        :param reg_list:    the registers an access can be put in and be a stack variable
+        :param sp_reg:      the name of the stack pointer
+        :param bp_reg:      the name of the base pointer
+        :param bp_based:    whether accesses relative to the base pointer are stack variables
+        """
+        self._arch = arch
+        self._mask = 2 ** arch.bits - 1
+        self._reg_values = dict(reg_values)
+        self._reg_values[sp_reg] = ("sp", 0, False)
+        if bp_based:
+            self._reg_values[bp_reg] = ("bp", 0, False)
+        self._reg_list = reg_list
+        self._bp_reg = bp_reg
+        self._bp_based = bp_based
+
+    def _full_reg(self, offset, size):
+        """
+        :return: the name of the register if the offset and size in bytes cover exactly one, otherwise None
+        """
+        name = reg_name(self._arch, offset)
+        if name is None or self._arch.registers[name] != (offset, size):
+            return None
+        return name
+
+    def _expr(self, e, tmps, regs):
+        tag = e.tag
+        if tag == "Iex_Const":
+            return None, e.con.value, False
+        if tag == "Iex_RdTmp":
+            return tmps.get(e.tmp)
+        if tag == "Iex_Get":
+            name = self._full_reg(e.offset, self._arch.bytes)
+            if name is not None and e.ty == "Ity_I%d" % self._arch.bits:
+                return regs.get(name)
+            # part of a register holding a stack address
+            return TAINTED if _stacky(regs.get(reg_name(self._arch, e.offset))) else None
+        if tag == "Iex_Load":
+            # memory never holds the symbolic stack pointers, the address is checked by the statement
+            return None
+
+        if tag == "Iex_ITE":
+            args = [self._expr(a, tmps, regs) for a in (e.cond, e.iftrue, e.iffalse)]
+        elif tag in ("Iex_Unop", "Iex_Binop", "Iex_Triop", "Iex_Qop", "Iex_CCall"):
+            args = [self._expr(a, tmps, regs) for a in e.args]
+        else:
+            return TAINTED
+        if tag == "Iex_Binop" and e.op in ("Iop_Add%d" % self._arch.bits, "Iop_Sub%d" % self._arch.bits) and \
+                None not in args and TAINTED not in args:
+            a, b = args
+            if e.op.startswith("Iop_Add") and (a[0] is None or b[0] is None):
+                return a[0] or b[0], (a[1] + b[1]) & self._mask, a[2] or b[2]
+            # subtracting the same symbolic registers or pointers would cancel out, leave those to the solver
+            if e.op.startswith("Iop_Sub") and b[0] is None and not (a[2] and b[2]):
+                return a[0], (a[1] - b[1]) & self._mask, a[2] or b[2]
+        if tag == "Iex_Binop" and e.op in ("Iop_Shl%d" % self._arch.bits, "Iop_Mul%d" % self._arch.bits) and \
+                None not in args and TAINTED not in args:
+            a, b = args
+            if a[0] is None and b[0] is None and not b[2]:
+                factor = 1 << b[1] if e.op.startswith("Iop_Shl") else b[1]
+                return None, (a[1] * factor) & self._mask, a[2]
+
+        # anything else is only followed if it doesn't involve the stack
+        if any(_stacky(a) for a in args):
+            return TAINTED
+        return None
+
+    def accesses(self, irsb):
+        """
+        :param irsb:    the VEX of a single instruction
+        :return: a list of (base, offset, is_buffer, action) for the stack addresses it accesses or puts in registers,
+                 or None if it has to be stepped symbolically
+        """
+        tmps = dict()
+        regs = dict(self._reg_values)
+        found = []
+
+        def address(e, action):
+            v = self._expr(e, tmps, regs)
+            if v == TAINTED:
+                return False
+            if v is not None and v[0] is not None:
+                found.append((v[0], v[1], v[2], action))
+            return True
+
+        for s in irsb.statements:
+            tag = s.tag
+            if tag in _ignored_stmts:
+                continue
+            if tag == "Ist_WrTmp":
+                if s.data.tag == "Iex_Load" and not address(s.data.addr, "read"):
+                    return None
+                tmps[s.tmp] = self._expr(s.data, tmps, regs)
+            elif tag == "Ist_Store":
+                if not address(s.addr, "write"):
+                    return None
+            elif tag == "Ist_Put":
+                v = self._expr(s.data, tmps, regs)
+                name = self._full_reg(s.offset, _type_bytes(s.data.result_type(irsb.tyenv)))
+                if name is None:
+                    # a part of a register
+                    name = reg_name(self._arch, s.offset)
+                    if name in self._reg_list and _stacky(v):
+                        return None
+                    regs[name] = TAINTED if _stacky(v) or _stacky(regs.get(name)) else None
+                    continue
+                regs[name] = v
+                if name not in self._reg_list or (name == self._bp_reg and self._bp_based):
+                    continue
+                if v == TAINTED:
+                    return None
+                if v is not None and v[0] is not None:
+                    found.append((v[0], v[1], v[2], "load"))
+            else:
+                # exits, guarded loads and stores, dirty calls...
+                return None
+        return found
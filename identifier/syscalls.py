@@ -0,0 +1,91 @@
+import random
+
+import simuvex
+import claripy
+from tracer.simprocedures import FixedOutTransmit, FixedInReceive
+from .backend import concrete_int
+
+import logging
+l = logging.getLogger("identifier.syscalls")
+
+# state options the runner sets on prepared states
+# kill paths that transmit, receive or ask for random data of an unreasonable size
+LIMIT_IO = "IDENTIFIER_LIMIT_IO"
+# fill small random buffers with concrete data instead of symbolic
+CONCRETE_RAND = "IDENTIFIER_CONCRETE_RAND"
+
+MAX_TRANSMIT = 0x10000
+MAX_RECEIVE = 0x10000
+MAX_RANDOM = 0x1000
+# random buffers up to this size are concrete with CONCRETE_RAND
+MAX_CONCRETE_RANDOM = 100
+
+# the generator concrete random data comes from
+rand = random.Random()
+
+_CgcRandom = simuvex.SimProcedures['cgc']['random']
+
+
+def seed(s=None):
+    """
+    Reseeds the generator of concrete random data
+    """
+    rand.seed(s)
+
+
+def register():
+    """
+    Installs the procedures for the cgc syscalls, they behave like the default ones on states without the options
+    """
+    simuvex.SimProcedures['cgc']['transmit'] = LimitedTransmit
+    simuvex.SimProcedures['cgc']['receive'] = LimitedReceive
+    simuvex.SimProcedures['cgc']['random'] = LimitedRandom
+
+
+def _size(state, count):
+    val = concrete_int(state, count)
+    if val is None:
+        val = state.se.any_int(count)
+    return val
+
+
+def _kill(state):
+    # FIXME maybe we need to fix transmit/receive to handle huge vals properly
+    state.add_constraints(claripy.BoolV(False))
+    return state.se.BVV(0, state.arch.bits)
+
+
+class LimitedTransmit(FixedOutTransmit):
+    # pylint:disable=arguments-differ
+    def run(self, fd, buf, count, tx_bytes):
+        if LIMIT_IO in self.state.options and _size(self.state, count) > MAX_TRANSMIT:
+            return _kill(self.state)
+        return super(LimitedTransmit, self).run(fd, buf, count, tx_bytes)
+
+
+class LimitedReceive(FixedInReceive):
+    # pylint:disable=arguments-differ
+    def run(self, fd, buf, count, rx_bytes):
+        if LIMIT_IO in self.state.options and _size(self.state, count) > MAX_RECEIVE:
+            return _kill(self.state)
+        return super(LimitedReceive, self).run(fd, buf, count, rx_bytes)
+
+
+class LimitedRandom(_CgcRandom):
+    # pylint:disable=arguments-differ
+    def run(self, buf, count, rnd_bytes):
+        if LIMIT_IO not in self.state.options and CONCRETE_RAND not in self.state.options:
+            return super(LimitedRandom, self).run(buf, count, rnd_bytes)
+
+        size = _size(self.state, count)
+        if LIMIT_IO in self.state.options and size > MAX_RANDOM:
+            return _kill(self.state)
+        if CONCRETE_RAND not in self.state.options or size > MAX_CONCRETE_RANDOM:
+            return super(LimitedRandom, self).run(buf, count, rnd_bytes)
+
+        # one store for the whole buffer
+        if size > 0:
+            self.state.memory.store(buf, self.state.se.BVV(rand.getrandbits(size * 8), size * 8))
+        if concrete_int(self.state, rnd_bytes) != 0:
+            self.state.memory.store(rnd_bytes, count, endness='Iend_LE')
+        return self.state.se.BVV(0, self.state.arch.bits)
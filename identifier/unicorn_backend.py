@@ -0,0 +1,397 @@
+import struct
+
+import simuvex
+from .backend import Backend, OutputWatch, ProbeResult, arg_layout, ARG_REGION
+from .errors import BackendFallback
+from . import syscalls
+
+try:
+    import unicorn
+    from unicorn import x86_const
+except ImportError:
+    unicorn = None
+
+import logging
+l = logging.getLogger("identifier.unicorn_backend")
+
+PAGE_SIZE = 0x1000
+# the cgc stack ends here and can grow down to 8MB
+CGC_STACK_TOP = 0xbaaab000
+CGC_STACK_SIZE = 0x800000
+# bytes below the stack pointer of the base state that are copied, they can hold leftovers the function reads
+STACK_COPY_BELOW = 0x10000
+FLAG_PAGE = 0x4347c000
+ARG_REGION_SIZE = 0x10000
+# angr lets unicorn run this many blocks in one step, the runner sets it as state.unicorn.max_steps
+BLOCKS_PER_STEP = 10000
+
+# cgc syscall numbers
+SYS_TERMINATE = 1
+SYS_TRANSMIT = 2
+SYS_RECEIVE = 3
+SYS_FDWAIT = 4
+SYS_ALLOCATE = 5
+SYS_DEALLOCATE = 6
+SYS_RANDOM = 7
+
+_REGS = ("eax", "ebx", "ecx", "edx", "esi", "edi", "ebp")
+
+
+def _concrete(state, val):
+    if isinstance(val, (int, long)):
+        return val
+    return state.se.any_int(val)
+
+
+def available():
+    """
+    :return: whether unicorn can be imported
+    """
+    return unicorn is not None
+
+
+class UnicornBackend(Backend):
+    """
+    Runs a concrete call natively in unicorn, starting from a copy of the memory and registers of the runner's
+    prepared state. The cgc syscalls are emulated in python the way the runner's angr states handle them.
+    Anything angr would have to make symbolic raises BackendFallback, so the next backend runs the call instead.
+    """
+
+    def __init__(self, runner):
+        """
+        :param runner: the runner, only x86 cgc binaries are supported
+        """
+        super(UnicornBackend, self).__init__(runner)
+        if unicorn is None:
+            raise BackendFallback("unicorn is not installed")
+        if self.project.arch.name != "X86":
+            raise BackendFallback("unsupported arch %s" % self.project.arch.name)
+
+        self._deadend_addr = self.project._simos.return_deadend
+        # the image is copied from the runner's template on the first call
+        self._ready = False
+        self._unusable = None
+
+    def _load(self):
+        if self._unusable is not None:
+            raise BackendFallback(self._unusable)
+        if self._ready:
+            return
+        try:
+            self._load_state(self.runner._get_template(False))
+        except BackendFallback as e:
+            l.warning("not running calls natively: %s", e.message)
+            self._unusable = e.message
+            raise
+        self._ready = True
+
+    def _load_state(self, state):
+        # page address -> permissions, and (address, bytes) to write after mapping
+        self._pages = dict()
+        self._writes = []
+        self._allocation_base = _concrete(state, state.cgc.allocation_base)
+        self._build_image(self.project, state)
+        self._maps = self._coalesce_maps()
+
+        self._regs = []
+        for name in _REGS:
+            reg = getattr(state.regs, name)
+            if state.se.symbolic(reg):
+                raise BackendFallback("symbolic register %s" % name)
+            self._regs.append((getattr(x86_const, "UC_X86_REG_" + name.upper()), state.se.any_int(reg)))
+        self._sp = state.se.any_int(state.regs.sp)
+
+    def _build_image(self, project, state):
+        for seg in project.loader.main_bin.segments:
+            perms = 0
+            if seg.is_readable:
+                perms |= unicorn.UC_PROT_READ
+            if seg.is_writable:
+                perms |= unicorn.UC_PROT_WRITE
+            if seg.is_executable:
+                perms |= unicorn.UC_PROT_EXEC
+            self._copy(state, seg.vaddr, seg.memsize, perms)
+
+        rw = unicorn.UC_PROT_READ | unicorn.UC_PROT_WRITE
+        self._copy(state, FLAG_PAGE, PAGE_SIZE, rw)
+        self._copy(state, ARG_REGION, ARG_REGION_SIZE, unicorn.UC_PROT_ALL)
+
+        # memory allocated before the first receive
+        initial_base = _concrete(state, project.factory.entry_state().cgc.allocation_base)
+        if self._allocation_base < initial_base:
+            self._copy(state, self._allocation_base, initial_base - self._allocation_base, unicorn.UC_PROT_ALL)
+
+        sp = state.se.any_int(state.regs.sp)
+        self._map(CGC_STACK_TOP - CGC_STACK_SIZE, CGC_STACK_SIZE, rw)
+        copy_start = max((sp & ~(PAGE_SIZE - 1)) - STACK_COPY_BELOW, CGC_STACK_TOP - CGC_STACK_SIZE)
+        self._copy(state, copy_start, CGC_STACK_TOP - copy_start, rw)
+
+    def _map(self, addr, size, perms):
+        page = addr & ~(PAGE_SIZE - 1)
+        while page < addr + size:
+            self._pages[page] = self._pages.get(page, 0) | perms
+            page += PAGE_SIZE
+
+    def _copy(self, state, addr, size, perms):
+        """
+        Maps the pages of the range and copies the ones that are mapped in the state
+        """
+        self._map(addr, size, perms)
+        page = addr & ~(PAGE_SIZE - 1)
+        while page < addr + size:
+            try:
+                data = state.memory.load(page, PAGE_SIZE)
+            except simuvex.SimError:
+                # not mapped in the state, unicorn leaves it zeroed
+                page += PAGE_SIZE
+                continue
+            if state.se.symbolic(data):
+                raise BackendFallback("symbolic memory at %#x" % page)
+            self._writes.append((page, state.se.any_str(data)))
+            page += PAGE_SIZE
+
+    def _coalesce_maps(self):
+        maps = []
+        for page in sorted(self._pages):
+            perms = self._pages[page]
+            if maps and maps[-1][0] + maps[-1][1] == page and maps[-1][2] == perms:
+                maps[-1][1] += PAGE_SIZE
+            else:
+                maps.append([page, PAGE_SIZE, perms])
+        return maps
+
+    def run(self, function, test_data, reads, concrete_rand=False, custom_offs=None, early_abort=False):
+        self._load()
+        if not all(isinstance(i, (str, int, long)) for i in test_data.input_args):
+            raise BackendFallback("symbolic arguments")
+
+        mapped_input, stores = arg_layout(test_data.input_args, custom_offs)
+        idxs = sorted(reads)
+        watch = OutputWatch(test_data) if early_abort else None
+        result = self.call(function.startpoint.addr, mapped_input, stores, test_data.preloaded_stdin,
+                           test_data.max_steps, concrete_rand=concrete_rand,
+                           reads=[(mapped_input[i], reads[i]) for i in idxs], watch=watch)
+        self.runs += 1
+        if result is None:
+            return None
+        return_val, outputs, stdout = result
+        return ProbeResult(return_val, dict(zip(idxs, outputs)), stdout)
+
+    def call(self, addr, args, stores, stdin, max_steps, concrete_rand=False, reads=(), watch=None):
+        """
+        :param addr:            the address of the function
+        :param args:            the integer arguments of the call
+        :param stores:          a list of (address, bytes) to write in the argument region before the call
+        :param stdin:           the bytes receive reads from
+        :param max_steps:       the max_steps of the test, counted the way angr steps the call, see _NativeRun
+        :param concrete_rand:   fill random buffers from the python random module instead of falling back
+        :param reads:           a list of (address, length) to read after the call
+        :param watch:           an OutputWatch to stop the call at the first stdout that can't match
+        :return: (return value, list of the bytes read, stdout), or None if the call failed
+        :raises BackendFallback: if the call did something only angr can tell the outcome of
+        """
+        uc = unicorn.Uc(unicorn.UC_ARCH_X86, unicorn.UC_MODE_32)
+        for start, size, perms in self._maps:
+            uc.mem_map(start, size, perms)
+        for start, data in self._writes:
+            uc.mem_write(start, data)
+        for start, data in stores:
+            uc.mem_write(start, data)
+
+        for reg, val in self._regs:
+            uc.reg_write(reg, val)
+        # cdecl, the arguments and then the return address are pushed
+        sp = self._sp - 4 * (len(args) + 1)
+        uc.mem_write(sp, struct.pack("<%dI" % (len(args) + 1), self._deadend_addr, *[a & 0xffffffff for a in args]))
+        uc.reg_write(x86_const.UC_X86_REG_ESP, sp)
+
+        run = _NativeRun(self, uc, stdin, concrete_rand, max_steps, watch)
+        uc.hook_add(unicorn.UC_HOOK_INTR, run.on_interrupt)
+        uc.hook_add(unicorn.UC_HOOK_BLOCK, run.on_block)
+        try:
+            uc.emu_start(addr, self._deadend_addr)
+        except unicorn.UcError as e:
+            # a fault is a segfault in angr too
+            if run.fallback is None and not run.failed:
+                l.debug("native call faulted: %s", e)
+                return None
+
+        if run.fallback is not None:
+            raise BackendFallback(run.fallback)
+        if run.aborted:
+            self.aborts += 1
+            self.steps_saved += max(max_steps - run.steps, 0)
+            return None
+        if run.failed or uc.reg_read(x86_const.UC_X86_REG_EIP) != self._deadend_addr:
+            return None
+        # the path still has to step through the return to deadend
+        if not run.take_step():
+            return None
+
+        try:
+            outputs = [str(uc.mem_read(a, length)) for a, length in reads]
+        except unicorn.UcError:
+            raise BackendFallback("output argument not mapped")
+        return uc.reg_read(x86_const.UC_X86_REG_EAX), outputs, "".join(run.stdout)
+
+
+def _hook(func):
+    """
+    Exceptions don't make it through unicorn's callbacks, anything a hook raises fails the run
+    """
+    def wrapper(self, uc, *args):
+        try:
+            func(self, uc, *args)
+        except Exception as e:  # pylint:disable=broad-except
+            l.debug("native hook failed: %s", e)
+            self._stop()
+    return wrapper
+
+
+class _NativeRun(object):
+    """
+    The state of one native call, its hooks emulate the syscalls.
+    Steps are counted the way angr's unicorn plugin takes them: a run of up to BLOCKS_PER_STEP blocks in unicorn is one
+    step, ended early by any syscall but transmit, which unicorn handles itself. Every other syscall is a step of its
+    own, and so is the return to the deadend address.
+    """
+
+    def __init__(self, backend, uc, stdin, concrete_rand, max_steps, watch=None):
+        self.backend = backend
+        self.uc = uc
+        self.stdin = stdin
+        self.stdin_pos = 0
+        self.stdout = []
+        self.concrete_rand = concrete_rand
+        self.max_steps = max_steps
+        self.steps = 0
+        # blocks run since the current unicorn step started, 0 when the next block starts a new one
+        self.step_blocks = 0
+        self.allocation_base = backend._allocation_base
+        self.watch = watch
+        # set when the call has to be run in angr, or when angr would have failed it
+        self.fallback = None
+        self.failed = False
+        # set when the watch saw stdout that can't match
+        self.aborted = False
+
+    def _abort(self):
+        self.aborted = True
+        self.uc.emu_stop()
+
+    def _stop(self, fallback=None):
+        if fallback is not None:
+            self.fallback = fallback
+        else:
+            self.failed = True
+        self.uc.emu_stop()
+
+    def take_step(self):
+        """
+        :return: False if the step is past max_steps, angr fails the call then
+        """
+        self.steps += 1
+        return self.steps <= self.max_steps
+
+    @_hook
+    def on_block(self, uc, address, size, user_data):
+        if self.backend.project.is_hooked(address):
+            self._stop("reached hooked address %#x" % address)
+            return
+        if self.step_blocks == 0 or self.step_blocks >= BLOCKS_PER_STEP:
+            self.step_blocks = 0
+            if not self.take_step():
+                self._stop()
+                return
+        self.step_blocks += 1
+
+    @_hook
+    def on_interrupt(self, uc, intno, user_data):
+        # a syscall touching unmapped memory raises UcError, which kills the path in angr too
+        if intno != 0x80:
+            self._stop("interrupt %#x" % intno)
+            return
+        self._syscall(uc)
+
+    def _syscall(self, uc):
+        num = uc.reg_read(x86_const.UC_X86_REG_EAX)
+        a1 = uc.reg_read(x86_const.UC_X86_REG_EBX)
+        a2 = uc.reg_read(x86_const.UC_X86_REG_ECX)
+        a3 = uc.reg_read(x86_const.UC_X86_REG_EDX)
+        a4 = uc.reg_read(x86_const.UC_X86_REG_ESI)
+
+        if num != SYS_TRANSMIT:
+            # unicorn stops for the syscall procedure, the next block starts a new step
+            self.step_blocks = 0
+            if not self.take_step():
+                self._stop()
+                return
+
+        if num == SYS_TRANSMIT:
+            fd, buf, count, tx_bytes = a1, a2, a3, a4
+            # same limits as the syscall procedures
+            if count > syscalls.MAX_TRANSMIT:
+                self._stop()
+                return
+            if fd != 1:
+                self._stop("transmit to fd %d" % fd)
+                return
+            self.stdout.append(str(uc.mem_read(buf, count)))
+            if tx_bytes != 0:
+                uc.mem_write(tx_bytes, struct.pack("<I", count))
+            if self.watch is not None and not self.watch.stdout_matches("".join(self.stdout)):
+                self._abort()
+                return
+
+        elif num == SYS_RECEIVE:
+            fd, buf, count, rx_bytes = a1, a2, a3, a4
+            if count > syscalls.MAX_RECEIVE:
+                self._stop()
+                return
+            if fd != 0:
+                self._stop("receive from fd %d" % fd)
+                return
+            data = self.stdin[self.stdin_pos:self.stdin_pos + count]
+            if count > 0 and len(data) == 0:
+                self._stop("receive past the end of stdin")
+                return
+            uc.mem_write(buf, data)
+            self.stdin_pos += len(data)
+            if rx_bytes != 0:
+                uc.mem_write(rx_bytes, struct.pack("<I", len(data)))
+
+        elif num == SYS_RANDOM:
+            buf, count, rnd_bytes = a1, a2, a3
+            if count > syscalls.MAX_RANDOM:
+                self._stop()
+                return
+            # angr leaves the bytes symbolic unless they are made concrete
+            if not self.concrete_rand or count > syscalls.MAX_CONCRETE_RANDOM:
+                self._stop("symbolic random")
+                return
+            if count > 0:
+                uc.mem_write(buf, ("%0*x" % (count * 2, syscalls.rand.getrandbits(count * 8))).decode("hex"))
+            if rnd_bytes != 0:
+                uc.mem_write(rnd_bytes, struct.pack("<I", count))
+
+        elif num == SYS_ALLOCATE:
+            length, addr_ptr = a1, a3
+            if length == 0:
+                self._stop("allocate of size 0")
+                return
+            aligned = (length + PAGE_SIZE - 1) & ~(PAGE_SIZE - 1)
+            self.allocation_base -= aligned
+            uc.mem_map(self.allocation_base, aligned, unicorn.UC_PROT_ALL)
+            if addr_ptr != 0:
+                uc.mem_write(addr_ptr, struct.pack("<I", self.allocation_base))
+
+        elif num == SYS_TERMINATE:
+            # the function never returns
+            self._stop()
+            return
+
+        else:
+            self._stop("syscall %d" % num)
+            return
+
+        uc.reg_write(x86_const.UC_X86_REG_EAX, 0)
@@ -0,0 +1,148 @@
+import angr
+import simuvex
+import simuvex.s_options as so
+import claripy
+import identifier
+from identifier import syscalls
+from identifier.func import TestData
+from tracer.simprocedures import FixedOutTransmit, FixedInReceive
+
+import os
+import time
+import random
+bin_location = str(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../binaries'))
+
+import logging
+l = logging.getLogger("identifier.bench_setup_state")
+
+NUM_SETUPS = 200
+
+
+def _baseline_syscall_hook(state):
+    # kill path that try to read/write large amounts
+    syscall_name = state.inspect.syscall_name
+    if syscall_name == "transmit":
+        count = state.se.any_int(state.regs.edx)
+        if count > 0x10000:
+            state.regs.edx = 0
+            state.add_constraints(claripy.BoolV(False))
+    if syscall_name == "receive":
+        count = state.se.any_int(state.regs.edx)
+        if count > 0x10000:
+            state.regs.edx = 0
+            state.add_constraints(claripy.BoolV(False))
+    if syscall_name == "random":
+        count = state.se.any_int(state.regs.ecx)
+        if count > 0x1000:
+            state.regs.ecx = 0
+            state.add_constraints(claripy.BoolV(False))
+
+
+def _baseline_syscall_hook_concrete_rand(state):
+    syscall_name = state.inspect.syscall_name
+    if syscall_name == "random":
+        count = state.se.any_int(state.regs.ecx)
+        if count > 100:
+            return
+        buf = state.se.any_int(state.regs.ebx)
+        for i in range(count):
+            a = random.randint(0, 255)
+            state.memory.store(buf+i, state.se.BVV(a, 8))
+
+
+def baseline_setup_state(runner, function, test_data, initial_state=None, concrete_rand=False):
+    """
+    Runner.setup_state as it was before the template, every call registers the procedures and breakpoints and
+    rebuilds the posix plugin of an entry state
+    """
+    simuvex.SimProcedures['cgc']['transmit'] = FixedOutTransmit
+    simuvex.SimProcedures['cgc']['receive'] = FixedInReceive
+
+    fs = {'/dev/stdin': simuvex.storage.file.SimFile(
+        "/dev/stdin", "r",
+        size=len(test_data.preloaded_stdin))}
+
+    if initial_state is None:
+        temp_state = runner.project.factory.entry_state(fs=fs)
+        entry_state = runner._get_base_state().copy()
+        entry_state.register_plugin("posix", temp_state.posix)
+        temp_state.release_plugin("posix")
+        entry_state.ip = function.startpoint.addr
+    else:
+        entry_state = initial_state.copy()
+
+    # set stdin
+    entry_state.cgc.input_size = len(test_data.preloaded_stdin)
+    if len(test_data.preloaded_stdin) > 0:
+        entry_state.posix.files[0].content.store(0, test_data.preloaded_stdin)
+
+    entry_state.options.add(so.STRICT_PAGE_ACCESS)
+
+    # make sure unicorn will run
+    for k in dir(entry_state.regs):
+        r = getattr(entry_state.regs, k)
+        if r.symbolic:
+            setattr(entry_state.regs, k, 0)
+
+    entry_state.unicorn._register_check_count = 100
+    entry_state.unicorn._runs_since_symbolic_data = 100
+    entry_state.unicorn._runs_since_unicorn = 100
+
+    # cooldowns
+    entry_state.unicorn.cooldown_symbolic_registers = 0
+    entry_state.unicorn.cooldown_symbolic_memory = 0
+    entry_state.unicorn.cooldown_nonunicorn_blocks = 1
+    entry_state.unicorn.max_steps = 10000
+
+    # syscall hook
+    entry_state.inspect.b('syscall', simuvex.BP_BEFORE, action=_baseline_syscall_hook)
+    if concrete_rand:
+        entry_state.inspect.b('syscall', simuvex.BP_AFTER, action=_baseline_syscall_hook_concrete_rand)
+
+    # solver timeout
+    entry_state.se._solver.timeout = 500
+
+    return entry_state
+
+
+def time_setup(setup, func, test):
+    """
+    :param setup:   takes the function and the test and returns the state
+    :return: the average time in seconds of one call of setup
+    """
+    # build the base state (and the template) outside of the timed loop
+    setup(func, test)
+
+    start = time.time()
+    for _ in xrange(NUM_SETUPS):
+        setup(func, test)
+    return (time.time() - start) / NUM_SETUPS
+
+
+def bench_setup_state():
+    """
+    :return: the average time in seconds of the baseline setup_state and of the one using the template
+    """
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+    runner = identifier.runner.Runner(p, cfg)
+    func = cfg.functions[0x804a0f0]
+    test = TestData(["asdf\x00", "asdf\x00"], [None, None], None, 10, preloaded_stdin="abcd")
+
+    try:
+        before = time_setup(lambda f, t: baseline_setup_state(runner, f, t), func, test)
+    finally:
+        # the baseline replaced the runner's procedures
+        syscalls.register()
+    after = time_setup(runner.setup_state, func, test)
+
+    l.info("baseline setup_state: %.2f ms", before * 1000)
+    l.info("setup_state from the template: %.2f ms", after * 1000)
+    l.info("speedup: %.1fx", before / after)
+    return before, after
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    l.setLevel("INFO")
+    bench_setup_state()
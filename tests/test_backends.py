@@ -0,0 +1,202 @@
+import angr
+import nose
+import claripy
+import identifier
+from identifier.func import TestData
+from identifier.backend import AngrBackend, OutputWatch, concrete_bytes, concrete_int, read_buffers
+from identifier.unicorn_backend import UnicornBackend
+from identifier.errors import BackendFallback
+
+import os
+bin_location = str(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../binaries'))
+
+import logging
+logging.getLogger("identifier").setLevel("DEBUG")
+
+# the backends every deployment can choose from, new ones should be added here
+BACKENDS = [AngrBackend, UnicornBackend]
+
+STRNCMP = 0x804a3d0
+STRCMP = 0x804a0f0
+MEMCMP = 0x8048e60
+
+# (function address, test, argument index -> bytes to read, expected return value or None to only compare with angr)
+CASES = [
+    (STRCMP, TestData(["asdf", "asdf"], [None, None], None, 10), {0: 5, 1: 5}, 0),
+    (STRCMP, TestData(["abc", "abd"], [None, None], None, 10), {0: 4, 1: 4}, None),
+    (STRCMP, TestData(["abd", "abc"], [None, None], None, 10), {}, None),
+    (STRNCMP, TestData(["abcx", "abcy", 3], [None, None, None], None, 10), {0: 0x100}, 0),
+    (STRNCMP, TestData(["abcx", "abcy", 4], [None, None, None], None, 10), {}, None),
+    (MEMCMP, TestData(["a\x00bc", "a\x00bc", 4], [None, None, None], None, 10), {0: 4, 1: 4}, 0),
+    (MEMCMP, TestData(["a\x00bc", "a\x00bd", 4], [None, None, None], None, 10), {}, None),
+]
+
+_project = None
+
+
+def _load():
+    global _project
+    if _project is None:
+        p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+        _project = (p, p.analyses.CFGFast(resolve_indirect_jumps=True))
+    return _project
+
+
+def _make_backend(backend_cls):
+    p, cfg = _load()
+    runner = identifier.runner.Runner(p, cfg, backends=[])
+    try:
+        return backend_cls(runner)
+    except BackendFallback as e:
+        raise nose.SkipTest("%s is not available: %s" % (backend_cls.__name__, e.message))
+
+
+def check_conformance(backend_cls):
+    """
+    Checks that a backend runs the cases like the angr backend does, a backend may fall back on any of them
+    """
+    p, cfg = _load()
+    backend = _make_backend(backend_cls)
+    reference = _make_backend(AngrBackend)
+
+    ran = 0
+    for addr, test, reads, expected_return in CASES:
+        func = cfg.functions[addr]
+        try:
+            result = backend.run(func, test, reads)
+        except BackendFallback:
+            continue
+        ran += 1
+        expected = reference.run(func, test, reads)
+
+        nose.tools.assert_is_not_none(result)
+        nose.tools.assert_equal(sorted(result.outputs.keys()), sorted(reads.keys()))
+        for i, length in reads.items():
+            nose.tools.assert_equal(len(result.outputs[i]), length)
+        nose.tools.assert_equal(result.outputs, expected.outputs)
+        nose.tools.assert_equal(result.return_val, expected.return_val)
+        nose.tools.assert_equal(result.stdout, expected.stdout)
+        if expected_return is not None:
+            nose.tools.assert_equal(result.return_val, expected_return)
+
+    nose.tools.assert_equal(backend.runs, ran)
+
+
+def check_symbolic_arguments(backend_cls):
+    """
+    Checks that a backend either runs symbolic arguments or falls back, and never reports a wrong failure
+    """
+    p, cfg = _load()
+    backend = _make_backend(backend_cls)
+    test = TestData([claripy.BVV("asdf\x00"), "asdf"], [None, None], None, 10)
+    try:
+        result = backend.run(cfg.functions[STRCMP], test, {})
+    except BackendFallback:
+        return
+    nose.tools.assert_equal(result.return_val, 0)
+
+
+def check_runner(backend_cls, early_abort=False):
+    """
+    Checks that a runner using the backend in front of angr passes and fails the same tests
+    """
+    p, cfg = _load()
+    _make_backend(backend_cls)
+    runner = identifier.runner.Runner(p, cfg, backends=[backend_cls, AngrBackend], early_abort=early_abort)
+    strcmp = cfg.functions[STRCMP]
+
+    nose.tools.assert_true(runner.test(strcmp, TestData(["asdf", "asdf"], ["asdf", "asdf"], 0, 10)))
+    nose.tools.assert_false(runner.test(strcmp, TestData(["asdf", "asdf"], ["asdf", "asdf"], 1234, 10)))
+    nose.tools.assert_false(runner.test(strcmp, TestData(["asdf", "asdf"], ["asdg", "asdf"], 0, 10)))
+    probe = runner.probe(strcmp, TestData(["asdf", "asdf"], [None, None], None, 10))
+    nose.tools.assert_equal(probe.return_val, 0)
+
+
+def check_step_limits(backend_cls):
+    """
+    Checks that a backend fails a call for running out of steps exactly when angr does
+    """
+    p, cfg = _load()
+    backend = _make_backend(backend_cls)
+    reference = _make_backend(AngrBackend)
+    strcmp = cfg.functions[STRCMP]
+
+    for max_steps in xrange(1, 8):
+        test = TestData(["asdf", "asdf"], [None, None], None, max_steps)
+        try:
+            result = backend.run(strcmp, test, {})
+        except BackendFallback:
+            continue
+        expected = reference.run(strcmp, test, {})
+        nose.tools.assert_equal(result is None, expected is None, "max_steps %d" % max_steps)
+
+
+def test_backends():
+    for backend_cls in BACKENDS:
+        yield check_conformance, backend_cls
+        yield check_symbolic_arguments, backend_cls
+        yield check_step_limits, backend_cls
+        yield check_runner, backend_cls
+        yield check_runner, backend_cls, True
+
+def test_output_watch():
+    test = TestData(["abcd", 5], ["xbcd", None], None, 10, expected_stdout="hello")
+    watch = OutputWatch(test)
+
+    nose.tools.assert_true(watch.stdout_matches(""))
+    nose.tools.assert_true(watch.stdout_matches("hel"))
+    nose.tools.assert_false(watch.stdout_matches("help"))
+    nose.tools.assert_false(watch.stdout_matches("hello!"))
+
+
+# itoa(unsigned n, char *buf): writes the digits of n in reverse and then swaps them in place, returns buf
+REVERSE_ITOA = (
+    "\x53\x56\x57\x8b\x44\x24\x10\x8b\x7c\x24\x14\x89\xfe\xb9\x0a\x00\x00\x00\x31\xd2\xf7\xf1\x80\xc2"
+    "\x30\x88\x16\x46\x85\xc0\x75\xf2\xc6\x06\x00\x4e\x39\xf7\x73\x0c\x8a\x07\x8a\x1e\x88\x1f\x88\x06"
+    "\x47\x4e\xeb\xf0\x8b\x44\x24\x14\x5f\x5e\x5b\xc3"
+)
+
+
+def test_early_abort_rewrites():
+    # the itoa is written over strncmp in a project of its own
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    p.loader.memory.write_bytes(STRNCMP, REVERSE_ITOA)
+    cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+    itoa = cfg.functions[STRNCMP]
+
+    for backends in ([AngrBackend], [UnicornBackend, AngrBackend]):
+        runner = identifier.runner.Runner(p, cfg, backends=backends, early_abort=True)
+        nose.tools.assert_true(runner.test(itoa, TestData([12345, "A" * 8], [None, "12345\x00"], 0x2000, 50)))
+        nose.tools.assert_false(runner.test(itoa, TestData([12345, "A" * 8], [None, "54321\x00"], 0x2000, 50)))
+        nose.tools.assert_equal(runner.abort_stats()[0], 0)
+
+
+def test_concrete_reads():
+    p, _ = _load()
+    s = p.factory.blank_state()
+    s.memory.store(0x2000, "abc\x00")
+    s.memory.store(0x3000, "def\x00")
+    s.memory.store(0x9000, "ghi\x00")
+    s.memory.store(0x3100, s.se.BVS("sym", 32))
+
+    nose.tools.assert_equal(concrete_int(s, claripy.BVV(5, 32)), 5)
+    nose.tools.assert_is_none(concrete_int(s, claripy.BVS("x", 32)))
+    nose.tools.assert_equal(concrete_bytes(s, claripy.BVV(0x0061, 16)), "\x00a")
+    nose.tools.assert_equal(concrete_bytes(s, s.memory.load(0x2000, 4)), "abc\x00")
+
+    # the symbolic region is in the same load as the first two, so they are read on their own instead
+    regions = [(0x3000, 3), (0x2000, 4), (0x9000, 3), (0x3100, 4)]
+    nose.tools.assert_equal(read_buffers(s, regions), ["def", "abc\x00", "ghi", None])
+
+def run_all():
+    functions = globals()
+    all_functions = dict(filter((lambda (k, v): k.startswith('test_')), functions.items()))
+    for f in sorted(all_functions.keys()):
+        if hasattr(all_functions[f], '__call__'):
+            checks = all_functions[f]()
+            # generator tests yield their checks, plain ones return None
+            for check in checks or ():
+                check[0](*check[1:])
+
+if __name__ == "__main__":
+    run_all()
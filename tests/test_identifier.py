@@ -1,8 +1,17 @@
 import angr
 import nose
+import claripy
 import identifier
+from identifier.func import Func, TestData
+from identifier.cache import DiskCache, LRUCache
+from identifier.arg_roles import rank_arg_orders, DEREF, COMPARED, BYTE
+from simuvex.s_errors import SimEngineError, SimMemoryError
+
+from collections import defaultdict
 
 import os
+import shutil
+import tempfile
 bin_location = str(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../binaries'))
 
 import logging
@@ -24,6 +33,653 @@ def test_comparison_identification():
 
     for addr, symbol in true_symbols.items():
         nose.tools.assert_equal(true_symbols[addr], seen[addr])
+        nose.tools.assert_true(idfer.emulation_counts[addr] > 0)
+
+def test_parallel_identification():
+    """
+    Test that identifying in a process pool finds the same functions
+    """
+
+    true_symbols = {0x804a3d0: 'strncmp', 0x804a0f0: 'strcmp', 0x8048e60: 'memcmp', 0x8049f40: 'strcasecmp'}
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    # the closures early_abort adds to the runner can't be pickled, matches must not carry it back
+    for early_abort in (False, True):
+        idfer = identifier.Identifier(p, require_predecessors=False, early_abort=early_abort)
+
+        seen = dict()
+        for addr, symbol in idfer.run(workers=4):
+            seen[addr] = symbol
+
+        for addr, symbol in true_symbols.items():
+            nose.tools.assert_equal(true_symbols[addr], seen[addr])
+        for match_name, match in idfer.matches.values():
+            nose.tools.assert_false(hasattr(match, "_runner"))
+
+def test_parallel_func_info():
+    """
+    Test that the stack analysis finds the same FuncInfo in a process pool as in this process
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+    serial = identifier.Identifier(p, cfg=cfg, require_predecessors=False)
+    serial.compute_func_info(workers=1)
+    parallel = identifier.Identifier(p, cfg=cfg, require_predecessors=False, workers=4)
+    parallel.compute_func_info()
+
+    nose.tools.assert_equal(parallel.func_info.pending(), [])
+    nose.tools.assert_equal(sorted(f.addr for f in parallel.func_info), sorted(f.addr for f in serial.func_info))
+    nose.tools.assert_true(len(serial.func_info) > 0)
+    for f, func_info in serial.func_info.items():
+        for field in identifier.identify.FuncInfo._fields:
+            nose.tools.assert_equal(getattr(parallel.func_info[f], field), getattr(func_info, field),
+                                    "%s differs for %#x" % (field, f.addr))
+
+def test_block_stack_vars_parity():
+    """
+    Test that resolving accesses from the vex and running each block once find the same stack variables as
+    stepping every instruction
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    idfer.compute_func_info()
+    nose.tools.assert_true(len(idfer.func_info) > 0)
+
+    for f, func_info in idfer.func_info.items():
+        symbolic = idfer.find_stack_vars_x86(f, per_instruction=True, static_offsets=False)
+        for other in (func_info, idfer.find_stack_vars_x86(f, static_offsets=False)):
+            for field in identifier.identify.FuncInfo._fields:
+                nose.tools.assert_equal(getattr(symbolic, field), getattr(other, field),
+                                        "%s differs for %#x" % (field, f.addr))
+
+def test_preamble_parity():
+    """
+    Test that the preamble found from one trace of the first block is the one stepping each prefix of it finds
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    funcs = [f for f in idfer._cfg.functions.values() if not f.is_syscall and not p.is_hooked(f.addr)]
+
+    found = 0
+    for f in sorted(funcs, key=lambda f: f.addr):
+        results = []
+        for per_prefix in (False, True):
+            try:
+                results.append(idfer.find_stack_vars_x86(f, per_prefix=per_prefix))
+            except (identifier.errors.IdentifierException, SimEngineError, SimMemoryError) as e:
+                results.append(e.message)
+        nose.tools.assert_equal(type(results[0]), type(results[1]), "%#x: %s" % (f.addr, results))
+        if isinstance(results[0], basestring):
+            nose.tools.assert_equal(results[0], results[1])
+            continue
+        found += 1
+        for field in identifier.identify.FuncInfo._fields:
+            nose.tools.assert_equal(getattr(results[0], field), getattr(results[1], field),
+                                    "%s differs for %#x" % (field, f.addr))
+    nose.tools.assert_true(found > 0)
+
+def test_block_cache():
+    """
+    Test that analyzing a function again reuses its lifted blocks
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    idfer.compute_func_info()
+    f = max(idfer.func_info, key=lambda f: len(f.block_addrs_set))
+
+    before = idfer.cache_stats()
+    nose.tools.assert_true(before["insn_facts"][1] > 0)
+    idfer.find_stack_vars_x86(f)
+    after = idfer.cache_stats()
+    for name in ("block", "insn_facts"):
+        nose.tools.assert_equal(after[name][1], before[name][1])
+        nose.tools.assert_true(after[name][0] > before[name][0])
+
+def test_lazy_func_info():
+    """
+    Test that the stack analysis only runs for the functions that are asked about
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    strcmp = idfer._cfg.functions[0x804a0f0]
+    memcmp = idfer._cfg.functions[0x8048e60]
+    nose.tools.assert_equal(idfer.func_info.computed(strcmp), None)
+
+    func_info = idfer.get_func_info(strcmp.addr)
+    nose.tools.assert_equal(len(func_info.stack_args), 2)
+    nose.tools.assert_equal(idfer.func_info.computed(strcmp), (func_info,))
+    nose.tools.assert_equal(idfer.func_info.computed(memcmp), None)
+    # iterating doesn't analyze the rest
+    nose.tools.assert_equal(list(idfer.func_info), [strcmp])
+    nose.tools.assert_equal(len(idfer.func_info), 1)
+    nose.tools.assert_equal(idfer.func_info.computed(memcmp), None)
+
+    # without a malloc match the special case pass for free doesn't need any of them
+    nose.tools.assert_false(identifier.functions.Functions["free"]().can_match(idfer))
+
+    idfer.compute_func_info()
+    nose.tools.assert_equal(idfer.func_info.pending(), [])
+    nose.tools.assert_true(idfer.func_info[strcmp] is func_info)
+
+def test_recv_state_snapshot():
+    """
+    Test that the receive-ready base state is reloaded from the snapshot directory
+    """
+
+    snapshot_dir = tempfile.mkdtemp()
+    try:
+        p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+        cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+
+        runner = identifier.runner.Runner(p, cfg, snapshot_dir=snapshot_dir)
+        state = runner._get_base_state()
+        nose.tools.assert_equal(runner._snapshots.misses, 1)
+
+        runner2 = identifier.runner.Runner(p, cfg, snapshot_dir=snapshot_dir)
+        state2 = runner2._get_base_state()
+        nose.tools.assert_equal(runner2._snapshots.hits, 1)
+        nose.tools.assert_equal(state.se.any_int(state.regs.ip), state2.se.any_int(state2.regs.ip))
+        nose.tools.assert_equal(state.se.any_int(state.regs.sp), state2.se.any_int(state2.regs.sp))
+    finally:
+        shutil.rmtree(snapshot_dir)
+
+def test_recv_state_fallback_not_snapshotted():
+    """
+    Test that a base state that didn't reach receive isn't stored for later runners
+    """
+
+    snapshot_dir = tempfile.mkdtemp()
+    try:
+        p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+        cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+
+        runner = identifier.runner.Runner(p, cfg, snapshot_dir=snapshot_dir)
+        runner._get_recv_state = lambda: (p.factory.entry_state(), False)
+        runner._get_base_state()
+        nose.tools.assert_equal(os.listdir(snapshot_dir), [])
+
+        runner2 = identifier.runner.Runner(p, cfg, snapshot_dir=snapshot_dir)
+        runner2._get_base_state()
+        nose.tools.assert_equal(runner2._snapshots.hits, 0)
+    finally:
+        shutil.rmtree(snapshot_dir)
+
+def test_many_stops_at_first_failure():
+    """
+    Test that Runner.test_many reports each test and stops at the first failure
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+    runner = identifier.runner.Runner(p, cfg)
+    strcmp = cfg.functions[0x804a0f0]
+
+    passing = TestData(["asdf", "asdf"], ["asdf", "asdf"], 0, 10)
+    failing = TestData(["asdf", "asdf"], ["asdf", "asdf"], 1234, 10)
+    outcomes = runner.test_many(strcmp, [passing, failing, passing])
+
+    nose.tools.assert_equal([o.passed for o in outcomes], [True, False])
+    nose.tools.assert_true(all(o.elapsed > 0 for o in outcomes))
+
+def test_first_passing():
+    """
+    Test that Runner.first_passing stops at the first test that passes
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+    runner = identifier.runner.Runner(p, cfg)
+    strcmp = cfg.functions[0x804a0f0]
+
+    passing = TestData(["asdf", "asdf"], ["asdf", "asdf"], 0, 10)
+    failing = TestData(["asdf", "asdf"], ["asdf", "asdf"], 1234, 10)
+
+    nose.tools.assert_equal(runner.first_passing(strcmp, [failing, passing, failing]), 1)
+    nose.tools.assert_equal(runner.first_passing(strcmp, [failing]), None)
+    # the failing test ran once, its result was reused
+    nose.tools.assert_equal(runner.emulations, 2)
+    # early abort is off unless the runner was asked for it
+    nose.tools.assert_equal(runner.abort_stats()[0], 0)
+
+def test_limited_syscalls():
+    """
+    Test that the syscall procedures kill oversized calls and only make random data concrete when asked to
+    """
+
+    from identifier import syscalls
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+
+    def make_state(*options):
+        s = p.factory.entry_state()
+        for o in options:
+            s.options.add(o)
+        return s, s.se.any_int(s.regs.sp) - 0x100
+
+    def call(proc, s, *args):
+        return proc(s, inline=True, arguments=[s.se.BVV(a, 32) for a in args]).ret_expr
+
+    s, buf = make_state(syscalls.LIMIT_IO)
+    s.memory.store(buf, "hello")
+    call(syscalls.LimitedTransmit, s, 1, buf, 5, 0)
+    nose.tools.assert_true(s.satisfiable())
+    nose.tools.assert_equal(s.posix.dumps(1), "hello")
+
+    # oversized calls kill the path
+    for proc, limit in ((syscalls.LimitedTransmit, syscalls.MAX_TRANSMIT),
+                        (syscalls.LimitedReceive, syscalls.MAX_RECEIVE)):
+        s, buf = make_state(syscalls.LIMIT_IO)
+        call(proc, s, 1, buf, limit + 1, 0)
+        nose.tools.assert_false(s.satisfiable())
+    s, buf = make_state(syscalls.LIMIT_IO)
+    call(syscalls.LimitedRandom, s, buf, syscalls.MAX_RANDOM + 1, 0)
+    nose.tools.assert_false(s.satisfiable())
+
+    # concrete random data comes from the seeded generator
+    data = []
+    for _ in xrange(2):
+        syscalls.seed(0)
+        s, buf = make_state(syscalls.LIMIT_IO, syscalls.CONCRETE_RAND)
+        call(syscalls.LimitedRandom, s, buf, 8, buf + 8)
+        nose.tools.assert_false(s.se.symbolic(s.memory.load(buf, 8)))
+        nose.tools.assert_equal(s.se.any_int(s.memory.load(buf + 8, 4, endness="Iend_LE")), 8)
+        data.append(s.se.any_str(s.memory.load(buf, 8)))
+    nose.tools.assert_equal(data[0], data[1])
+
+    # without the options, or past the concrete size, random data stays symbolic
+    for options in ((), (syscalls.CONCRETE_RAND,)):
+        s, buf = make_state(*options)
+        call(syscalls.LimitedRandom, s, buf, syscalls.MAX_CONCRETE_RANDOM + 1, 0)
+        nose.tools.assert_true(s.satisfiable())
+        nose.tools.assert_true(s.se.symbolic(s.memory.load(buf, 8)))
+
+# a malloc that hands out the last freed chunk again, its free, and a function that only returns
+# the allocator state is kept in the unused part of the cgc stack
+HEAP_MALLOC = "\xa1\xf8\xaf\x6a\xba\x85\xc0\x74\x0b\xc7\x05\xf8\xaf\x6a\xba\x00\x00\x00\x00\xc3\xa1\xfc\xaf\x6a\xba" \
+              "\x8d\x48\x01\x89\x0d\xfc\xaf\x6a\xba\xc1\xe0\x07\x05\x00\xb0\x6a\xba\xc3"
+HEAP_FREE = "\x8b\x44\x24\x04\xa3\xf8\xaf\x6a\xba\xc3"
+HEAP_NOP = "\xc3"
+
+def test_free_match():
+    """
+    Test that free is found by malloc reusing a chunk it freed, and that a function that doesn't free isn't
+    """
+
+    # written over strncmp, strcmp and memcmp in a project of their own
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    for addr, code in ((0x804a3d0, HEAP_MALLOC), (0x804a0f0, HEAP_FREE), (0x8048e60, HEAP_NOP)):
+        p.loader.memory.write_bytes(addr, code)
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    malloc = idfer._cfg.functions[0x804a3d0]
+    idfer.matches[malloc] = "malloc", identifier.functions.Functions["malloc"]()
+
+    free = identifier.functions.Functions["free"]()
+    nose.tools.assert_true(free.try_match(idfer._cfg.functions[0x804a0f0], idfer, idfer._runner))
+    nose.tools.assert_false(free.try_match(idfer._cfg.functions[0x8048e60], idfer, idfer._runner))
+    # nothing but the declared attributes is kept on a match
+    nose.tools.assert_equal(free.match_attrs(), {})
+
+    # candidates that leave the heap alone reuse the malloc calls of the ones before them
+    runner = idfer._runner
+    get_out_state = runner.get_out_state
+    calls = defaultdict(int)
+
+    def counting_get_out_state(function, *args, **kwargs):
+        calls[function.addr] += 1
+        return get_out_state(function, *args, **kwargs)
+
+    runner.get_out_state = counting_get_out_state
+    for addr in (0x8048e60, 0x8049f40, 0x8048e60):
+        nose.tools.assert_false(free.try_match(idfer._cfg.functions[addr], idfer, runner))
+    nose.tools.assert_equal(calls[malloc.addr], 0)
+    nose.tools.assert_true(calls[0x8048e60] > 0)
+
+class _StrcmpTest(Func):
+    """
+    A candidate for the filter test that only has necessary tests
+    """
+    test = None
+
+    def get_name(self):
+        return self.__class__.__name__
+
+    def num_args(self):
+        return 2
+
+    def necessary_tests(self):
+        return [self.test]
+
+def test_filter_candidates():
+    """
+    Test that candidates with the same test inputs share a run and that tests which can't be shared run on their own
+    """
+
+    class equal(_StrcmpTest):
+        test = TestData(["asdf", "asdf"], [None, None], 0, 10)
+
+    class not_equal(_StrcmpTest):
+        test = TestData(["asdf", "asdf"], [None, None], 1, 10)
+
+    # the symbolic arguments have no fingerprint
+    class sym_equal(_StrcmpTest):
+        test = TestData([claripy.BVV("asdf\x00"), "asdf"], [None, None], 0, 10)
+
+    class sym_not_equal(_StrcmpTest):
+        test = TestData([claripy.BVV("abcd\x00"), "asdf"], [None, None], 0, 10)
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    strcmp = idfer._cfg.functions[0x804a0f0]
+    candidates = [equal, not_equal, sym_equal, sym_not_equal]
+
+    functions = identifier.identify.Functions
+    identifier.identify.Functions = dict((c.__name__, c) for c in candidates)
+    try:
+        passed = idfer._filter_candidates(strcmp, [c.__name__ for c in candidates])
+    finally:
+        identifier.identify.Functions = functions
+
+    nose.tools.assert_equal(passed, ["equal", "sym_equal"])
+    # one run for the shared inputs, one for each symbolic test
+    nose.tools.assert_equal(idfer._runner.emulations, 3)
+
+def test_test_after_probe():
+    """
+    Test that a test is answered from a probe of the same inputs, such as a pretest that is also a necessary test
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    runner = idfer._runner
+    strcmp = idfer._cfg.functions[0x804a0f0]
+
+    runner.probe(strcmp, TestData(["asdf", "asdf"], [None, None], None, 10))
+    nose.tools.assert_true(runner.test(strcmp, TestData(["asdf", "asdf"], ["asdf", "asdf"], 0, 10)))
+    nose.tools.assert_false(runner.test(strcmp, TestData(["asdf", "asdf"], ["asdf", "asdf"], 1, 10)))
+    outcomes = runner.test_many(strcmp, [TestData(["asdf", "asdf"], ["asdf", None], 0, 10)])
+    nose.tools.assert_true(outcomes[0].passed)
+    nose.tools.assert_equal(runner.emulations, 1)
+
+    # the probe can't tell with a different number of steps
+    nose.tools.assert_true(runner.test(strcmp, TestData(["asdf", "asdf"], ["asdf", "asdf"], 0, 11)))
+    nose.tools.assert_equal(runner.emulations, 2)
+
+def test_normalized_hash_order():
+    """
+    Test that the hashes the match cache is keyed by don't depend on the order the functions are hashed in
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    cfg = p.analyses.CFGFast(resolve_indirect_jumps=True)
+    funcs = sorted((f for f in cfg.functions.values() if not f.is_syscall), key=lambda f: f.addr)
+
+    forward = identifier.Identifier(p, cfg=cfg, require_predecessors=False)
+    backward = identifier.Identifier(p, cfg=cfg, require_predecessors=False)
+    hashes = [forward._normalized_hash(f) for f in funcs]
+    nose.tools.assert_equal(hashes, [backward._normalized_hash(f) for f in reversed(funcs)][::-1])
+
+def test_match_attrs():
+    """
+    Test that a cached match only keeps the attributes its Func declares
+    """
+
+    match = identifier.functions.Functions["strncpy"]()
+    match.forced_null = True
+    match.scratch = object()
+    attrs = match.match_attrs()
+    nose.tools.assert_equal(attrs, {"forced_null": True})
+
+    restored = identifier.functions.Functions["strncpy"]()
+    restored.set_match_attrs(dict(attrs, gone=1))
+    nose.tools.assert_true(restored.forced_null)
+    nose.tools.assert_false(hasattr(restored, "gone"))
+
+def test_cached_identification():
+    """
+    Test that a second run on the same binary reuses the cached matches
+    """
+
+    true_symbols = {0x804a3d0: 'strncmp', 0x804a0f0: 'strcmp', 0x8048e60: 'memcmp', 0x8049f40: 'strcasecmp'}
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+        list(identifier.Identifier(p, require_predecessors=False, cache_dir=cache_dir).run())
+
+        idfer = identifier.Identifier(p, require_predecessors=False, cache_dir=cache_dir)
+        seen = dict(idfer.run())
+        nose.tools.assert_true(idfer._match_cache.hits > 0)
+        for addr, symbol in true_symbols.items():
+            nose.tools.assert_equal(true_symbols[addr], seen[addr])
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_disk_cache_lru():
+    """
+    Test that the disk cache evicts the least recently used entries
+    """
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = DiskCache(cache_dir, max_entries=2)
+        a, b, c = [DiskCache.make_key(k) for k in "abc"]
+        cache.put(a, 1)
+        cache.put(b, 2)
+        # make a more recently used than b
+        os.utime(os.path.join(cache_dir, b), (0, 0))
+        nose.tools.assert_equal(cache.get(a), 1)
+        cache.put(c, 3)
+
+        nose.tools.assert_equal(cache.evictions, 1)
+        nose.tools.assert_equal(cache.get(b), None)
+        nose.tools.assert_equal(cache.get(a), 1)
+        nose.tools.assert_equal(cache.get(c), 3)
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_disk_cache_slack():
+    """
+    Test that the disk cache only evicts once it grew past the slack, and then evicts a batch
+    """
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = DiskCache(cache_dir, max_entries=4, slack=2)
+        keys = [DiskCache.make_key(i) for i in xrange(7)]
+        for i, key in enumerate(keys[:6]):
+            cache.put(key, i)
+            # the oldest entries are the least recently used
+            os.utime(os.path.join(cache_dir, key), (i, i))
+        nose.tools.assert_equal(cache.evictions, 0)
+        nose.tools.assert_equal(len(os.listdir(cache_dir)), 6)
+
+        cache.put(keys[6], 6)
+        nose.tools.assert_equal(cache.evictions, 3)
+        nose.tools.assert_equal(sorted(os.listdir(cache_dir)), sorted(keys[3:]))
+    finally:
+        shutil.rmtree(cache_dir)
+
+def test_lru_cache():
+    """
+    Test that the in-memory cache keeps the most recently used entries
+    """
+
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    nose.tools.assert_equal(cache.get("a"), 1)
+    cache.put("c", 3)
+
+    nose.tools.assert_equal(cache.get("b"), None)
+    nose.tools.assert_equal(cache.get("a"), 1)
+    nose.tools.assert_equal(cache.get("c"), 3)
+    nose.tools.assert_equal((cache.hits, cache.misses), (3, 1))
+
+def test_candidate_index():
+    """
+    Test that the candidate index finds the same Functions as checking each of them
+    """
+
+    from identifier.functions import Functions, get_candidates
+
+    for num_args in xrange(8):
+        for var_args in (False, True):
+            for calls_other_funcs in (False, True):
+                expected = []
+                for name, func_class in Functions.iteritems():
+                    f = func_class()
+                    if num_args not in f.arg_counts() or f.var_args() != var_args:
+                        continue
+                    if calls_other_funcs and not f.can_call_other_funcs():
+                        continue
+                    expected.append(name)
+                nose.tools.assert_equal(get_candidates(num_args, var_args, calls_other_funcs), expected)
+
+    # versions that don't use all of their arguments are found with fewer
+    nose.tools.assert_true("int2str_v2" in get_candidates(2, False, False))
+    nose.tools.assert_true("int2str_v2" in get_candidates(3, False, False))
+    nose.tools.assert_false("strcmp" in get_candidates(2, False, True))
+
+def test_random_tests_needed():
+    """
+    Test that candidates get more random tests the more they were confused with others
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    atoi = identifier.functions.Functions["atoi"]()
+    identify = identifier.identify
+
+    nose.tools.assert_equal(idfer.random_tests_needed(atoi)[0], identify.MIN_RANDOM_TESTS)
+    # never fewer than the baseline with a rival
+    nose.tools.assert_equal(idfer.random_tests_needed(atoi, ["based_atoi"])[0], identify.NUM_TESTS)
+
+    # a wrong atoi failed the first random test
+    idfer._record_confusion(atoi, 0)
+    nose.tools.assert_equal(idfer.random_tests_needed(atoi)[0], identify.NUM_TESTS)
+    # and another one passed three first, escalate
+    idfer._record_confusion(atoi, 3)
+    nose.tools.assert_equal(idfer.random_tests_needed(atoi, ["based_atoi"])[0], identify.NUM_TESTS + 3)
+    idfer._record_confusion(atoi, identify.MAX_RANDOM_TESTS)
+    nose.tools.assert_equal(idfer.random_tests_needed(atoi), (identify.MAX_RANDOM_TESTS, "max tests"))
+
+    # other families are unaffected
+    strtol = identifier.functions.Functions["strtol"]()
+    nose.tools.assert_equal(idfer.random_tests_needed(strtol)[0], identify.MIN_RANDOM_TESTS)
+
+def test_rivals():
+    """
+    Test that every candidate left after the filter is a rival of the others, with necessary tests or without
+    """
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    strcmp = idfer._cfg.functions[0x804a0f0]
+
+    tested = []
+
+    def check_tests(cfg_func, match_func, rivals=()):
+        tested.append((match_func.__class__.__name__, sorted(rivals)))
+        return False
+
+    idfer.check_tests = check_tests
+    func_info = idfer.get_func_info(strcmp)
+    nose.tools.assert_is_none(idfer._find_match(strcmp, func_info))
+
+    names = [name for name, _ in tested]
+    nose.tools.assert_true(len(names) > 1)
+    for name, rivals in tested:
+        nose.tools.assert_equal(rivals, sorted(n for n in names if n != name))
+
+def test_int2str_probes():
+    """
+    Test that the int2str pretests don't rest on a single number
+    """
+
+    from identifier.functions.int2str import PROBE_NUMS, SIGNED_PROBE_NUMS
+
+    nose.tools.assert_true(len(set(len(str(n)) for n in PROBE_NUMS)) >= 3)
+    nose.tools.assert_true(all(n < 0 for n in SIGNED_PROBE_NUMS))
+    nose.tools.assert_true(len(set(len(str(n)) for n in SIGNED_PROBE_NUMS)) >= 2)
+    for name in ("int2str", "int2str_v2", "int2str_v3"):
+        tests = identifier.functions.Functions[name]().necessary_tests()
+        nose.tools.assert_equal(len(tests), len(PROBE_NUMS))
+
+def test_rank_arg_orders():
+    expected = [None, DEREF, BYTE, COMPARED]
+
+    # nothing known, every order in the usual order
+    orders = rank_arg_orders(expected, None)
+    nose.tools.assert_equal(len(orders), 24)
+    nose.tools.assert_equal(orders[0], (0, 1, 2, 3))
+
+    # the orders with the buffer in the dereferenced slot come first, the others are still tried
+    orders = rank_arg_orders(expected, [set(), {COMPARED}, {DEREF}, {COMPARED, BYTE}])
+    nose.tools.assert_equal(len(orders), 24)
+    nose.tools.assert_equal(len(set(orders)), 24)
+    nose.tools.assert_true(all(o[2] == 1 for o in orders[:6]))
+    nose.tools.assert_false(any(o[2] == 1 for o in orders[6:]))
+    nose.tools.assert_equal(orders[0], (0, 3, 1, 2))
+
+    # without a dereference the orders are only ranked by the other roles
+    orders = rank_arg_orders(expected, [{BYTE}, set(), set(), set()])
+    nose.tools.assert_equal(len(orders), 24)
+    nose.tools.assert_equal(orders[0][0], 2)
+
+def test_infer_arg_roles():
+    """
+    Test that the roles of the arguments of real functions are inferred through the shared block cache
+    """
+
+    from identifier.arg_roles import infer_arg_roles
+
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    idfer = identifier.Identifier(p, require_predecessors=False)
+
+    for addr, num_args in ((0x804a0f0, 2), (0x8048e60, 3)):
+        func_info = idfer.get_func_info(addr)
+        before = idfer.cache_stats()["block"]
+        roles = infer_arg_roles(p, func_info, idfer._blocks)
+        after = idfer.cache_stats()["block"]
+
+        nose.tools.assert_equal(len(roles), num_args)
+        # strcmp and memcmp read through both buffers, the length of memcmp is no pointer
+        nose.tools.assert_true(DEREF in roles[0])
+        nose.tools.assert_true(DEREF in roles[1])
+        if num_args == 3:
+            nose.tools.assert_false(DEREF in roles[2])
+        nose.tools.assert_true(sum(after) > sum(before))
+        # lifting through the project finds the same roles
+        nose.tools.assert_equal(infer_arg_roles(p, func_info), roles)
+
+# receive_until(max_len, buf, end_char), its arguments in an order the usual one doesn't start with
+RECEIVE_UNTIL = (
+    "\x55\x89\xe5\x53\x56\x57\x83\xec\x04\x31\xff\x3b\x7d\x08\x7d\x38\xb8\x03\x00\x00\x00\x31\xdb\x8b\x4d"
+    "\x0c\x01\xf9\xba\x01\x00\x00\x00\x89\xe6\xcd\x80\x85\xc0\x75\x1f\x83\x3c\x24\x00\x74\x19\x8b\x55\x0c"
+    "\x8a\x04\x3a\x3a\x45\x10\x74\x03\x47\xeb\xce\x8b\x55\x0c\xc6\x04\x3a\x00\x89\xf8\xeb\x05\xb8\xff\xff"
+    "\xff\xff\x83\xc4\x04\x5f\x5e\x5b\x5d\xc3"
+)
+
+def test_arg_orders_tried():
+    """
+    Test that the argument order of a receive_until is found with the first order tried
+    """
+
+    # written over strncmp in a project of its own
+    p = angr.Project(os.path.join(bin_location, "tests/i386/identifiable"))
+    p.loader.memory.write_bytes(0x804a3d0, RECEIVE_UNTIL)
+    idfer = identifier.Identifier(p, require_predecessors=False)
+    func = idfer._cfg.functions[0x804a3d0]
+
+    match = identifier.functions.Functions["receive_until"]()
+    nose.tools.assert_true(idfer.check_tests(func, match))
+    nose.tools.assert_equal(match.arg_order, (2, 0, 1))
+    nose.tools.assert_equal(idfer._runner.arg_orders_tried[(func.addr, "receive_until")], (1, 6))
 
 def run_all():
     functions = globals()